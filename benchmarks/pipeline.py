@@ -0,0 +1,153 @@
+"""Benchmarks the hot path of the action on synthetic lockfiles: parsing, diffing, formatting and a full do_diff run.
+
+Usage: python benchmarks/pipeline.py [--sizes 100 1000 10000] [--repeat N] [--check]
+"""
+
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any
+
+import requests_mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from diff_poetry_lock.run_poetry import diff, do_diff, format_comment, load_packages  # noqa: E402
+from diff_poetry_lock.test.helpers import create_settings, mock_get_file, mock_list_comments  # noqa: E402
+
+# Number of packages in the generated base lockfiles, and how often each step is timed
+SIZES = [100, 1000, 10000]
+REPEAT = 5
+# Budgets for --check, in milliseconds by the number of packages in the base lockfile. They bound the median of the
+# "do_diff (mocked Github)" step, a full run against mocked API responses, and are about ten times what a laptop
+# needs, so that --check fails on real regressions and not on a slow CI runner. Sizes without a budget are not checked.
+DO_DIFF_BUDGET_MS = {100: 500, 1000: 2500, 10000: 25000}
+
+PACKAGE_TEMPLATE = """\
+[[package]]
+name = "{name}"
+version = "{version}"
+description = "Synthetic package {name}"
+optional = false
+python-versions = ">=3.7"
+files = [
+    {{file = "{name}-{version}-py3-none-any.whl", hash = "sha256:{hash1:064x}"}},
+    {{file = "{name}-{version}.tar.gz", hash = "sha256:{hash2:064x}"}},
+]
+
+[package.dependencies]
+{dependencies}
+"""
+
+METADATA = """\
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.10"
+content-hash = "0000000000000000000000000000000000000000000000000000000000000000"
+"""
+
+
+def render_lockfile(packages: dict[str, str], rng: random.Random) -> bytes:
+    names = sorted(packages)
+    sections = []
+    for name in names:
+        dependencies = "\n".join(f'{dep} = ">=1.0"' for dep in rng.sample(names, min(3, len(names))) if dep != name)
+        sections.append(
+            PACKAGE_TEMPLATE.format(
+                name=name,
+                version=packages[name],
+                hash1=rng.getrandbits(256),
+                hash2=rng.getrandbits(256),
+                dependencies=dependencies,
+            ),
+        )
+    return ("\n".join(sections) + "\n" + METADATA).encode()
+
+
+def generate_lockfiles(size: int, seed: int = 0) -> tuple[bytes, bytes]:
+    # The head lockfile updates 10% of the base packages, removes 2% and adds 2% new ones
+    rng = random.Random(seed)  # noqa: S311
+    base = {f"package-{i}": f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 30)}" for i in range(size)}
+    head = dict(base)
+    names = list(base)
+    for name in rng.sample(names, size // 10):
+        major, minor, patch = (int(part) for part in head[name].split("."))
+        head[name] = f"{major}.{minor}.{patch + 1}"
+    for name in rng.sample(names, size // 50):
+        del head[name]
+    for i in range(size // 50):
+        head[f"new-package-{i}"] = "1.0.0"
+    return render_lockfile(base, rng), render_lockfile(head, rng)
+
+
+def measure(func: Callable[[], Any], repeat: int) -> tuple[list[float], int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def run_do_diff(base: bytes, head: bytes) -> None:
+    cfg = create_settings()
+    with requests_mock.Mocker() as m:
+        mock_get_file(m, cfg, base, cfg.base_ref)
+        mock_get_file(m, cfg, head, cfg.ref)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+        with redirect_stdout(io.StringIO()):
+            do_diff(cfg)
+
+
+def benchmark(size: int, repeat: int) -> dict[str, tuple[list[float], int]]:
+    base, head = generate_lockfiles(size)
+    old, new = load_packages(base), load_packages(head)
+    packages = diff(old, new)
+
+    return {
+        "load_packages": measure(lambda: load_packages(base), repeat),
+        "diff": measure(lambda: diff(old, new), repeat),
+        "format_comment": measure(lambda: format_comment(packages), repeat),
+        "do_diff (mocked Github)": measure(lambda: run_do_diff(base, head), repeat),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--check", action="store_true", help="fail if do_diff exceeds its budget for a size")
+    args = parser.parse_args()
+
+    over_budget = []
+    print(f"{'packages':>8}  {'step':<24} {'median':>10} {'min':>10} {'peak memory':>12}")
+    for size in args.sizes:
+        for step, (timings, peak) in benchmark(size, args.repeat).items():
+            median, fastest = statistics.median(timings) * 1000, min(timings) * 1000
+            print(f"{size:>8}  {step:<24} {median:>7.2f} ms {fastest:>7.2f} ms {peak / 1024:>9.0f} KiB")
+            budget = DO_DIFF_BUDGET_MS.get(size)
+            if step.startswith("do_diff") and budget is not None and median > budget:
+                over_budget.append(f"do_diff with {size} packages took {median:.0f} ms, the budget is {budget} ms")
+
+    if args.check and over_budget:
+        print("\n".join(over_budget), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Measures how long the action takes from process start until its first request reaches the Github API.
+
+Usage: python benchmarks/startup.py [--runs N] [--python /venv/bin/python]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from diff_poetry_lock.test.stub_server import StubGithubServer, StubResponse  # noqa: E402
+
+
+def time_to_first_request(python: str) -> float:
+    first_request = threading.Event()
+
+    def not_found(_: BaseHTTPRequestHandler) -> StubResponse:
+        first_request.set()
+        return 404, {}, b"{}"
+
+    server = StubGithubServer()
+    server.route("GET", "/repos/user/repo/contents/poetry.lock", not_found)
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "GITHUB_EVENT_NAME": "pull_request",
+        "GITHUB_REF": "refs/pull/1/merge",
+        "GITHUB_REPOSITORY": "user/repo",
+        "GITHUB_BASE_REF": "main",
+        "GITHUB_API_URL": server.url,
+        "INPUT_GITHUB_TOKEN": "foobar",
+    }
+
+    with server.running():
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [python, "-m", "diff_poetry_lock.run_poetry"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        first_request.wait(timeout=60)
+        elapsed = time.perf_counter() - start
+        process.wait()
+    return elapsed
+
+
+def time_import(python: str, module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    output = subprocess.run([python, "-c", code], env=env, capture_output=True, check=True)
+    return float(output.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--python", default=sys.executable, help="interpreter to benchmark, e.g. the image's venv")
+    args = parser.parse_args()
+
+    results = {
+        "time to first request": [time_to_first_request(args.python) for _ in range(args.runs)],
+        "import diff_poetry_lock.run_poetry": [time_import(args.python, "diff_poetry_lock.run_poetry")],
+        "import poetry.packages (fallback only)": [time_import(args.python, "poetry.packages")],
+    }
+    for name, timings in results.items():
+        print(f"{name:<40} median {statistics.median(timings) * 1000:8.1f} ms  (min {min(timings) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
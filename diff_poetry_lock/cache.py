@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import NamedTuple
+
+from diff_poetry_lock.lockfile import LockedPackage
+
+# Bump whenever the layout of cached entries changes, so stale entries are never read back
+CACHE_VERSION = 4
+
+
+# Content-addressed cache of parsed lockfiles, keyed by the git blob SHA of the lockfile. Entries are plain JSON files
+# in a single directory, so the directory can be persisted with actions/cache. The modification time of an entry
+# doubles as its last access time for LRU eviction.
+class LockfileCache:
+    def __init__(self, directory: str | Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"v{CACHE_VERSION}-{key}.json"
+
+    def get(self, key: str) -> list[LockedPackage] | None:
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        path.touch()
+        return [
+            LockedPackage(name, version, tuple(dependencies), digest) for name, version, dependencies, digest in entries
+        ]
+
+    def put(self, key: str, packages: list[LockedPackage]) -> None:
+        write_atomic(self._path(key), json.dumps(packages, separators=(",", ":")).encode())
+        evict_lru(self.directory, "*.json", self.max_bytes)
+
+
+# Parsed base lockfiles shared in memory by all pull requests of a batch run, keyed like LockfileCache. Pull requests
+# with the same base branch share its lockfile, which is then downloaded and parsed only once: concurrent loads of the
+# same key wait for the first one instead of repeating it. Memory grows with the number of base branches, not of pull
+# requests.
+class SharedLockfiles:
+    def __init__(self) -> None:
+        self._futures: dict[str, Future[list[LockedPackage]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str, load: Callable[[], list[LockedPackage]]) -> list[LockedPackage]:
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            packages = load()
+        except BaseException as ex:
+            # Failed loads are not shared, the next pull request tries again
+            with self._lock:
+                del self._futures[key]
+            future.set_exception(ex)
+            raise
+        future.set_result(packages)
+        return packages
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    headers: dict[str, str]
+    body: bytes
+
+
+# Stores the ETag, headers and body of Github API responses, so repeated requests can be sent with If-None-Match. Each
+# entry is a single file holding the ETag on the first line and the headers as JSON on the second, followed by the raw
+# body.
+class EtagCache:
+    def __init__(self, directory: str | Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"v{CACHE_VERSION}-{hashlib.sha256(key.encode()).hexdigest()}.http"
+
+    def get(self, key: str) -> CachedResponse | None:
+        path = self._path(key)
+        try:
+            etag, headers, body = path.read_bytes().split(b"\n", 2)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        path.touch()
+        return CachedResponse(etag.decode(), json.loads(headers), body)
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        headers = json.dumps(response.headers, separators=(",", ":")).encode()
+        write_atomic(self._path(key), response.etag.encode() + b"\n" + headers + b"\n" + response.body)
+        evict_lru(self.directory, "*.http", self.max_bytes)
+
+    def record(self, *, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+# Remembers the ids of the comments posted to each pull request, so later runs can fetch them directly instead of paging
+# through all comments of the pull request
+class CommentIdCache:
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}.id"
+
+    def get(self, key: str) -> list[int]:
+        try:
+            return [int(comment_id) for comment_id in self._path(key).read_text().split(",")]
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def put(self, key: str, comment_ids: list[int]) -> None:
+        if comment_ids:
+            write_atomic(self._path(key), ",".join(map(str, comment_ids)).encode())
+        else:
+            self._path(key).unlink(missing_ok=True)
+
+    def add(self, key: str, comment_id: int) -> None:
+        self.put(key, [*self.get(key), comment_id])
+
+    def remove(self, key: str, comment_id: int) -> None:
+        self.put(key, [i for i in self.get(key) if i != comment_id])
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    # Write to a temporary file first, so concurrent readers never see a partial entry
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    Path(tmp_name).replace(path)
+
+
+def evict_lru(directory: Path, pattern: str, max_bytes: int) -> None:
+    entries = []
+    for path in directory.glob(pattern):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
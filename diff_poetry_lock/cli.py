@@ -0,0 +1,139 @@
+import argparse
+import json
+import subprocess
+import sys
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import TextIO
+
+from diff_poetry_lock.graph import DependencyGraph, read_root_dependencies
+from diff_poetry_lock.run_poetry import (
+    PackageSummary,
+    explain_changes,
+    filter_updates,
+    format_comment,
+    iter_diff,
+    load_packages,
+)
+from diff_poetry_lock.versions import UPDATE_TYPES, parse_update_types
+
+
+def read_lockfile(source: str, lockfile_path: str, repo: str) -> bytes:
+    # A source is either a lockfile on disk or a git ref, in which case lockfile_path is read at that ref
+    if Path(source).is_file():
+        return Path(source).read_bytes()
+    return git_show(source, lockfile_path, repo)
+
+
+def read_roots(source: str, lockfile_path: str, repo: str) -> set[str]:
+    # The direct dependencies from the pyproject.toml next to the lockfile, empty if there is none
+    if Path(source).is_file():
+        return read_root_dependencies(lambda path: Path(path).read_bytes(), Path(source).as_posix())
+    return read_root_dependencies(lambda path: git_show(source, path, repo), lockfile_path)
+
+
+def git_show(source: str, path: str, repo: str) -> bytes:
+    r = subprocess.run(  # noqa: S603
+        ["git", "-C", repo, "show", f"{source}:{path}"],  # noqa: S607
+        capture_output=True,
+        check=False,
+    )
+    if r.returncode != 0:
+        raise FileNotFoundError(f"{source} is neither a file nor a git ref containing {path}")
+    return r.stdout
+
+
+def to_record(package: PackageSummary) -> dict[str, str | None]:
+    record = {
+        "name": package.name,
+        "change": package.change(),
+        "old_version": package.old_version,
+        "new_version": package.new_version,
+    }
+    if (update_type := package.update_type()) is not None:
+        record["update_type"] = update_type
+    if package.reason is not None:
+        record["reason"] = package.reason
+    return record
+
+
+def write_json_lines(packages: Iterable[PackageSummary], out: TextIO) -> None:
+    # Records are written as soon as they are produced, so consumers can process huge diffs incrementally
+    out.writelines(json.dumps(to_record(package)) + "\n" for package in packages)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="diff-poetry-lock",
+        description="Diff two Poetry lockfiles, given as paths on disk or as git refs.",
+    )
+    parser.add_argument("old", help="old lockfile: a path, or a git ref to read --lockfile-path from")
+    parser.add_argument("new", help="new lockfile: a path, or a git ref to read --lockfile-path from")
+    parser.add_argument("--lockfile-path", default="poetry.lock", help="lockfile path inside the repository")
+    parser.add_argument("--repo", default=".", help="git repository to resolve refs in")
+    parser.add_argument("--format", choices=["jsonl", "json", "markdown"], default="jsonl")
+    parser.add_argument("--all", action="store_true", help="include packages that did not change")
+    parser.add_argument("--use-poetry-locker", action="store_true", help="parse lockfiles with poetry's Locker")
+    parser.add_argument(
+        "--detect-artifact-changes",
+        action="store_true",
+        help="also report packages whose file hashes or source changed without a version change",
+    )
+    parser.add_argument(
+        "--update-types",
+        default="",
+        help=f"only report version updates of these types, separated by commas ({', '.join(UPDATE_TYPES)})",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="annotate changes with why the package is locked, based on the pyproject.toml next to the lockfile",
+    )
+    args = parser.parse_args(argv)
+    try:
+        update_types = parse_update_types(args.update_types)
+    except ValueError as ex:
+        parser.error(str(ex))
+
+    try:
+        old, new = (
+            load_packages(
+                read_lockfile(source, args.lockfile_path, args.repo),
+                use_locker=args.use_poetry_locker,
+                artifact_digests=args.detect_artifact_changes,
+            )
+            for source in (args.old, args.new)
+        )
+    except FileNotFoundError as ex:
+        print(str(ex), file=sys.stderr)
+        return 2
+
+    packages = iter_diff(old, new, compare_artifacts=args.detect_artifact_changes)
+    if args.explain:
+        old_graph, new_graph = (
+            DependencyGraph(locked, read_roots(source, args.lockfile_path, args.repo))
+            for locked, source in ((old, args.old), (new, args.new))
+        )
+        packages = explain_changes(packages, old_graph, new_graph)
+    if update_types:
+        packages = filter_updates(packages, update_types)
+
+    emit(packages, args.format, include_unchanged=args.all, out=sys.stdout)
+    return 0
+
+
+def emit(packages: Iterator[PackageSummary], fmt: str, *, include_unchanged: bool, out: TextIO) -> None:
+    if fmt == "markdown":
+        out.write((format_comment(list(packages)) or "No changes to lockfile detected") + "\n")
+        return
+
+    packages = (p for p in packages if include_unchanged or p.changed())
+    if fmt == "jsonl":
+        write_json_lines(packages, out)
+    else:
+        json.dump([to_record(p) for p in packages], out, indent=2)
+        out.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
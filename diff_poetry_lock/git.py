@@ -0,0 +1,65 @@
+import subprocess
+import sys
+from collections.abc import Iterable
+
+
+# Reads lockfiles straight from the object database of a local checkout, so they don't have to be downloaded
+class GitRepository:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def git(self, *args: str, stdin: bytes | None = None) -> subprocess.CompletedProcess[bytes]:
+        # The workspace is usually owned by a different user than the one running the action
+        return subprocess.run(  # noqa: S603
+            ["git", "-c", "safe.directory=*", "-C", self.path, *args],  # noqa: S607
+            input=stdin,
+            capture_output=True,
+            check=False,
+        )
+
+    def resolve(self, ref: str) -> str | None:
+        # Checkouts in Github Actions usually only contain the remote tracking refs of branches and pull requests
+        candidates = [ref, f"origin/{ref}", f"refs/remotes/{ref.removeprefix('refs/')}"]
+        for candidate in candidates:
+            try:
+                r = self.git("rev-parse", "--verify", "--quiet", f"{candidate}^{{commit}}")
+            except FileNotFoundError:
+                print("git is not installed, falling back to the Github API", file=sys.stderr)
+                return None
+            if r.returncode == 0:
+                return r.stdout.decode().strip()
+        return None
+
+    def ls_tree(self, commit: str, paths: Iterable[str] = ()) -> dict[str, str]:
+        # Maps the path of every file in the commit (or only the given paths) to its blob SHA
+        r = self.git("ls-tree", "-r", "-z", "--full-tree", commit, "--", *paths)
+        r.check_returncode()
+        tree = {}
+        for entry in r.stdout.split(b"\0"):
+            if not entry:
+                continue
+            info, path = entry.decode().split("\t", 1)
+            _, object_type, sha = info.split()
+            if object_type == "blob":
+                tree[path] = sha
+        return tree
+
+    def read_blobs(self, shas: Iterable[str]) -> dict[str, bytes]:
+        # A single `git cat-file --batch` process returns all blobs, missing objects are left out of the result
+        shas = list(dict.fromkeys(shas))
+        if not shas:
+            return {}
+
+        r = self.git("cat-file", "--batch", stdin="".join(f"{sha}\n" for sha in shas).encode())
+        r.check_returncode()
+        blobs, output, pos = {}, r.stdout, 0
+        for sha in shas:
+            end = output.index(b"\n", pos)
+            header = output[pos:end].decode().split()
+            pos = end + 1
+            if header[-1] == "missing":
+                continue
+            size = int(header[2])
+            blobs[sha] = output[pos : pos + size]
+            pos += size + 1
+        return blobs
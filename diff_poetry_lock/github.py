@@ -1,10 +1,24 @@
-import requests
+import base64
+import re
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
 from pydantic import BaseModel, Field, parse_obj_as
 from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
 
+from diff_poetry_lock.cache import CachedResponse, CommentIdCache, EtagCache
+from diff_poetry_lock.metrics import Metrics
 from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.transport import RetryingSession
 
 MAGIC_COMMENT_IDENTIFIER = "<!-- posted by Github Action nborrmann/diff-poetry-lock -->\n\n"
+# Ends every part of a comment that had to be split, so the lookup knows how many parts to look for
+PART_MARKER = re.compile(r"<!-- part (\d+) of (\d+) -->$")
 MAGIC_BOT_USER_ID = 41898282
 
 
@@ -20,10 +34,84 @@ class GithubComment(BaseModel):
         return self.body.startswith(MAGIC_COMMENT_IDENTIFIER) and self.user.id_ == MAGIC_BOT_USER_ID
 
 
+def is_bot_comment_data(data: dict[str, Any]) -> bool:
+    # Same check as GithubComment.is_bot_comment on the raw JSON, so other comments are never validated by pydantic
+    body, user = data.get("body") or "", data.get("user") or {}
+    return isinstance(body, str) and body.startswith(MAGIC_COMMENT_IDENTIFIER) and user.get("id") == MAGIC_BOT_USER_ID
+
+
+def part_marker(part: int, parts: int) -> str:
+    return f"<!-- part {part} of {parts} -->"
+
+
+def comment_parts(body: str) -> int:
+    # Number of parts of the comment this one belongs to, 1 if it was not split
+    match = PART_MARKER.search(body)
+    return int(match.group(2)) if match else 1
+
+
+def comment_part(body: str) -> int:
+    # Position of this comment among the parts of a split comment, starting at 1
+    match = PART_MARKER.search(body)
+    return int(match.group(1)) if match else 1
+
+
+def found_all_parts(bodies: list[str]) -> bool:
+    return bool(bodies) and len(bodies) >= max(comment_parts(body) for body in bodies)
+
+
+def cached_response(not_modified: Response, cached: CachedResponse) -> Response:
+    # The response the cached entry was stored from, for the request that was answered with 304 Not Modified
+    r = Response()
+    r.status_code = 200
+    r.reason = "OK"
+    r.headers = CaseInsensitiveDict(cached.headers)
+    r.raw = BytesIO(cached.body)
+    r.encoding = get_encoding_from_headers(r.headers)
+    r.url = not_modified.url
+    r.request = not_modified.request
+    return r
+
+
 class GithubApi:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        session: RetryingSession | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        # Batch runs share one session and one set of metrics between the clients of all pull requests
         self.s = settings
-        self.session = requests.session()
+        self.session = session or RetryingSession(retries=settings.http_retries, pool_size=settings.http_pool_size)
+        self.metrics = metrics or Metrics()
+        self.etags: EtagCache | None = None
+        self.comment_ids: CommentIdCache | None = None
+        # Lockfiles that came along with their blob SHA, by blob SHA, until take_contents is called
+        self._contents: dict[str, bytes] = {}
+        if settings.cache_dir:
+            self.etags = EtagCache(Path(settings.cache_dir) / "etags", settings.cache_max_bytes)
+            self.comment_ids = CommentIdCache(Path(settings.cache_dir) / "comments")
+
+    def get(self, url: str, params: dict[str, Any], accept: str) -> Response:
+        headers = {"Authorization": f"Bearer {self.s.token}", "Accept": accept}
+        if self.etags is None:
+            return self.session.get(url, params=params, headers=headers, timeout=10)
+
+        key = f"{url}?{sorted(params.items())}#{accept}"
+        cached = self.etags.get(key)
+        if cached is not None:
+            headers["If-None-Match"] = cached.etag
+
+        r = self.session.get(url, params=params, headers=headers, timeout=10)
+        # 304 responses are not counted against the rate limit
+        if r.status_code == 304 and cached is not None:  # noqa: PLR2004
+            self.etags.record(hit=True)
+            return cached_response(r, cached)
+
+        self.etags.record(hit=False)
+        if r.ok and "ETag" in r.headers:
+            self.etags.put(key, CachedResponse(r.headers["ETag"], dict(r.headers), r.content))
+        return r
 
     def post_comment(self, comment: str) -> None:
         if not comment:
@@ -37,6 +125,8 @@ class GithubApi:
             timeout=10,
         )
         r.raise_for_status()
+        if self.comment_ids is not None:
+            self.comment_ids.add(self._comment_key(), int(r.json()["id"]))
 
     def update_comment(self, comment_id: int, comment: str) -> None:
         r = self.session.patch(
@@ -47,40 +137,162 @@ class GithubApi:
         )
         r.raise_for_status()
 
+    def _comment_key(self) -> str:
+        return f"{self.s.repository}#{self.s.pr_num()}"
+
     def list_comments(self) -> list[GithubComment]:
-        all_comments, comments, page = [], None, 1
-        while comments is None or len(comments) == 100:  # noqa: PLR2004
-            r = self.session.get(
-                f"{self.s.api_url}/repos/{self.s.repository}/issues/{self.s.pr_num()}/comments",
-                params={"per_page": 100, "page": page},
-                headers={"Authorization": f"Bearer {self.s.token}", "Accept": "application/vnd.github+json"},
-                timeout=10,
+        if comments := self.remembered_comments():
+            return comments
+
+        comments = self.find_comments()
+        if self.comment_ids is not None:
+            self.comment_ids.put(self._comment_key(), [c.id_ for c in comments])
+        return comments
+
+    def remembered_comments(self) -> list[GithubComment]:
+        # The comments posted by an earlier run, as long as all of them still exist on this pull request
+        if self.comment_ids is None:
+            return []
+
+        comments = []
+        for comment_id in self.comment_ids.get(self._comment_key()):
+            r = self.get(
+                f"{self.s.api_url}/repos/{self.s.repository}/issues/comments/{comment_id}",
+                params={},
+                accept="application/vnd.github+json",
             )
+            if r.status_code == 404:  # noqa: PLR2004
+                break
             r.raise_for_status()
-            comments = parse_obj_as(list[GithubComment], r.json())
-            all_comments.extend(comments)
+            data = r.json()
+            if not is_bot_comment_data(data) or not data.get("issue_url", "").endswith(f"/issues/{self.s.pr_num()}"):
+                break
+            comments.append(GithubComment.parse_obj(data))
+        else:
+            return comments
+
+        self.comment_ids.put(self._comment_key(), [])
+        return []
+
+    def find_comments(self) -> list[GithubComment]:
+        # A first run posts the comment on the first page, while comments that were deleted and posted again by later
+        # runs are near the end. So the first page is read first and then the others from the last one backwards, until
+        # all parts of the comment were found. Pull requests without a bot comment are still read to the end, only a
+        # remembered comment id avoids that.
+        r = self._comments_page(1)
+        bot_comments = [c for c in r.json() if is_bot_comment_data(c)]
+        last_page = int(parse_qs(urlsplit(r.links["last"]["url"]).query)["page"][0]) if "last" in r.links else 1
+        for page in range(last_page, 1, -1):
+            if found_all_parts([c["body"] for c in bot_comments]):
+                break
+            bot_comments.extend(c for c in self._comments_page(page).json() if is_bot_comment_data(c))
+        bot_comments.sort(key=lambda c: (comment_part(c["body"]), c["id"]))
+        return parse_obj_as(list[GithubComment], bot_comments)
+
+    def _comments_page(self, page: int) -> Response:
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/issues/{self.s.pr_num()}/comments",
+            params={"per_page": 100, "page": page},
+            accept="application/vnd.github+json",
+        )
+        r.raise_for_status()
+        return r
+
+    def list_pull_requests(self) -> list[tuple[int, str, str]]:
+        # Number, base branch and head commit of every open pull request
+        pull_requests: list[tuple[int, str, str]] = []
+        pulls, page = None, 1
+        while pulls is None or len(pulls) == 100:  # noqa: PLR2004
+            r = self.get(
+                f"{self.s.api_url}/repos/{self.s.repository}/pulls",
+                params={"state": "open", "per_page": 100, "page": page},
+                accept="application/vnd.github+json",
+            )
+            r.raise_for_status()
+            pulls = r.json()
+            pull_requests.extend(
+                (int(pull["number"]), str(pull["base"]["ref"]), str(pull["head"]["sha"])) for pull in pulls
+            )
             page += 1
-        return [c for c in all_comments if c.is_bot_comment()]
+        return pull_requests
 
-    def get_file(self, ref: str) -> Response:
-        r = self.session.get(
-            f"{self.s.api_url}/repos/{self.s.repository}/contents/{self.s.lockfile_path}",
+    def has_ref(self, ref: str) -> bool:
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/git/ref/{ref.removeprefix('refs/')}",
+            params={},
+            accept="application/vnd.github+json",
+        )
+        if r.status_code == 404:  # noqa: PLR2004
+            return False
+        r.raise_for_status()
+        return True
+
+    def merge_base(self, base: str, head: str) -> str:
+        # The commits of the comparison are not needed, so only a single one is listed
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/compare/{base}...{head}",
+            params={"per_page": 1},
+            accept="application/vnd.github+json",
+        )
+        r.raise_for_status()
+        return str(r.json()["merge_base_commit"]["sha"])
+
+    def get_file(self, ref: str, path: str | None = None) -> bytes:
+        path = path or self.s.lockfile_path
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/contents/{path}",
             params={"ref": ref},
-            headers={"Authorization": f"Bearer {self.s.token}", "Accept": "application/vnd.github.raw"},
-            timeout=10,
-            stream=True,
+            accept="application/vnd.github.raw",
         )
         if r.status_code == 404:  # noqa: PLR2004
-            raise FileNotFoundError(f"Lockfile {self.s.lockfile_path} not found on branch {ref}")
+            raise FileNotFoundError(f"Lockfile {path} not found on branch {ref}")
         r.raise_for_status()
-        return r
+        return r.content
+
+    def get_file_sha(self, ref: str, path: str | None = None) -> str:
+        # The metadata of the lockfile alone, not a listing of its directory. Github includes the content of files up
+        # to 1 MB, which is kept for take_contents so the lockfile does not have to be downloaded again.
+        path = path or self.s.lockfile_path
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/contents/{path}",
+            params={"ref": ref},
+            accept="application/vnd.github.object",
+        )
+        if r.status_code != 404:  # noqa: PLR2004
+            r.raise_for_status()
+            entry = r.json()
+            if entry.get("type") == "file":
+                if entry.get("encoding") == "base64" and entry.get("content"):
+                    self._contents[str(entry["sha"])] = base64.b64decode(entry["content"])
+                return str(entry["sha"])
+        raise FileNotFoundError(f"Lockfile {path} not found on branch {ref}")
+
+    def take_contents(self) -> dict[str, bytes]:
+        contents, self._contents = self._contents, {}
+        return contents
+
+    def get_tree(self, ref: str) -> dict[str, str]:
+        # Maps the path of every file in the repository to its blob SHA
+        r = self.get(
+            f"{self.s.api_url}/repos/{self.s.repository}/git/trees/{ref}",
+            params={"recursive": 1},
+            accept="application/vnd.github+json",
+        )
+        r.raise_for_status()
+        tree = r.json()
+        if tree.get("truncated"):
+            print(f"File tree of {ref} is truncated, some lockfiles may be missing", file=sys.stderr)
+        return {entry["path"]: entry["sha"] for entry in tree["tree"] if entry["type"] == "blob"}
 
     def delete_comment(self, comment_id: int) -> None:
         r = self.session.delete(
             f"{self.s.api_url}/repos/{self.s.repository}/issues/comments/{comment_id}",
             headers={"Authorization": f"Bearer {self.s.token}", "Accept": "application/vnd.github+json"},
+            timeout=10,
         )
         r.raise_for_status()
+        if self.comment_ids is not None:
+            self.comment_ids.remove(self._comment_key(), comment_id)
 
     def upsert_comment(self, existing_comment: GithubComment | None, comment: str | None) -> None:
         if existing_comment is None and comment is None:
@@ -0,0 +1,88 @@
+import posixpath
+import re
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable
+from itertools import chain
+
+from diff_poetry_lock.lockfile import LockedPackage, canonicalize_name, load_toml
+
+# Number of dependents listed for packages that are not reachable from any root dependency
+MAX_DEPENDENTS = 3
+
+
+def root_dependencies(pyproject: bytes) -> set[str]:
+    # The direct dependencies of a project, from poetry's own tables as well as from PEP 621 metadata
+    data = load_toml(pyproject)
+    poetry = data.get("tool", {}).get("poetry", {})
+    names = set(poetry.get("dependencies", {})) | set(poetry.get("dev-dependencies", {}))
+    for group in poetry.get("group", {}).values():
+        names |= set(group.get("dependencies", {}))
+
+    project = data.get("project", {})
+    optional = project.get("optional-dependencies", {}).values()
+    for requirement in chain(project.get("dependencies", []), *optional):
+        if match := re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)", requirement):
+            names.add(match.group(1))
+
+    return {canonicalize_name(name) for name in names} - {"python"}
+
+
+def read_root_dependencies(read: Callable[[str], bytes], lockfile_path: str) -> set[str]:
+    # The direct dependencies from the pyproject.toml next to the lockfile, empty if read(path) raises
+    # FileNotFoundError for it
+    try:
+        return root_dependencies(read(posixpath.join(posixpath.dirname(lockfile_path), "pyproject.toml")))
+    except FileNotFoundError:
+        return set()
+
+
+class DependencyGraph:
+    # Built once per lockfile: a reverse-edge index (who requires a package) and a breadth-first search from the root
+    # dependencies that remembers the parent of every reachable package. Both take time linear in the size of the
+    # lockfile, after which explaining a package only walks its chain of parents.
+    def __init__(self, packages: Iterable[LockedPackage], roots: Iterable[str]) -> None:
+        self.names: dict[str, str] = {}
+        self.requires: dict[str, tuple[str, ...]] = {}
+        self.dependents: dict[str, list[str]] = defaultdict(list)
+        for package in packages:
+            name = canonicalize_name(package.name)
+            self.names[name] = package.name
+            self.requires[name] = package.dependencies
+            for dependency in package.dependencies:
+                self.dependents[dependency].append(name)
+
+        self.roots = {root for root in roots if root in self.names}
+        self.parents: dict[str, str | None] = dict.fromkeys(sorted(self.roots))
+        queue = deque(self.parents)
+        while queue:
+            name = queue.popleft()
+            for dependency in self.requires.get(name, ()):
+                if dependency in self.names and dependency not in self.parents:
+                    self.parents[dependency] = name
+                    queue.append(dependency)
+
+    def chain(self, name: str) -> list[str]:
+        # Shortest chain of requirements from a root dependency down to the package, empty if it's not reachable
+        name = canonicalize_name(name)
+        if name not in self.parents:
+            return []
+
+        path: list[str] = []
+        node: str | None = name
+        while node is not None:
+            path.append(self.names[node])
+            node = self.parents[node]
+        return path[::-1]
+
+    def explain(self, name: str) -> str | None:
+        path = self.chain(name)
+        if len(path) == 1:
+            return "direct dependency"
+        if path:
+            return f"via {' -> '.join(path[:-1])}"
+
+        dependents = sorted(self.names[d] for d in self.dependents.get(canonicalize_name(name), []))
+        if not dependents:
+            return None
+        more = f" and {len(dependents) - MAX_DEPENDENTS} more" if len(dependents) > MAX_DEPENDENTS else ""
+        return f"required by {', '.join(dependents[:MAX_DEPENDENTS])}{more}"
@@ -0,0 +1,150 @@
+import threading
+from typing import Any, NamedTuple
+
+from diff_poetry_lock.github import (
+    MAGIC_COMMENT_IDENTIFIER,
+    GithubApi,
+    GithubComment,
+    comment_part,
+    found_all_parts,
+)
+from diff_poetry_lock.metrics import Metrics
+from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.transport import RetryingSession
+
+BLOB_FIELDS = "... on Blob { oid text isTruncated }"
+COMMENT_FIELDS = """
+pullRequest(number: $number) {
+  comments(first: 100, after: $cursor) {
+    pageInfo { hasNextPage endCursor }
+    nodes { databaseId body author { ... on Bot { databaseId } ... on User { databaseId } } }
+  }
+}"""
+
+
+class GraphqlBlob(NamedTuple):
+    oid: str
+    text: str | None
+
+
+# Fetches the lockfiles on both refs and the pull request's comments in a single GraphQL query (plus one more query
+# per 100 additional comments), unless the ids of the comments are remembered in cache_dir. Everything the query does
+# not cover, like lockfiles matched by glob patterns or blobs too large to be returned inline, falls back to the REST
+# API.
+class GithubGraphqlApi(GithubApi):
+    def __init__(
+        self,
+        settings: Settings,
+        session: RetryingSession | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        super().__init__(settings, session, metrics)
+        self._lock = threading.Lock()
+        self._blobs: dict[tuple[str, str], GraphqlBlob | None] | None = None
+        self._comments: list[GithubComment] = []
+        self._remembered: list[GithubComment] = []
+
+    def graphql(self, query: str, variables: dict[str, Any]) -> dict[str, Any]:
+        r = self.session.post(
+            self.s.graphql_url,
+            headers={"Authorization": f"Bearer {self.s.token}"},
+            json={"query": query, "variables": variables},
+            timeout=10,
+        )
+        r.raise_for_status()
+        response = r.json()
+        if response.get("errors"):
+            raise ValueError(f"Github GraphQL query failed: {', '.join(e['message'] for e in response['errors'])}")
+        return dict(response["data"])
+
+    def prefetch(self) -> None:
+        with self._lock:
+            if self._blobs is not None:
+                return
+
+            # Comments remembered by an earlier run are fetched by their ids, so the query only needs the lockfiles
+            self._remembered = super().remembered_comments()
+            with_comments = not self._remembered
+            paths = [] if self.s.multiple_lockfiles() else self.s.lockfile_paths()
+            keys = [(ref, path) for ref in (self.s.base_ref, self.s.ref) for path in paths]
+            self._blobs = {}
+            if not keys and not with_comments:
+                return
+
+            blobs = "\n".join(f"f{i}: object(expression: $e{i}) {{ {BLOB_FIELDS} }}" for i in range(len(keys)))
+            expressions = "".join(f", $e{i}: String!" for i in range(len(keys)))
+            comment_variables = ", $number: Int!, $cursor: String" if with_comments else ""
+            query = f"""
+                query($owner: String!, $name: String!{comment_variables}{expressions}) {{
+                  repository(owner: $owner, name: $name) {{ {blobs} {COMMENT_FIELDS if with_comments else ""} }}
+                }}"""
+
+            owner, name = self.s.repository.split("/")
+            variables: dict[str, Any] = {"owner": owner, "name": name}
+            if with_comments:
+                variables |= {"number": int(self.s.pr_num()), "cursor": None}
+            variables |= {f"e{i}": f"{ref}:{path}" for i, (ref, path) in enumerate(keys)}
+
+            repository = self.graphql(query, variables)["repository"]
+            for i, key in enumerate(keys):
+                blob = repository[f"f{i}"]
+                text = None if blob is None or blob["isTruncated"] else blob["text"]
+                self._blobs[key] = GraphqlBlob(blob["oid"], text) if blob is not None else None
+            if not with_comments:
+                return
+
+            # Further pages of comments only need the comment part of the query, and are only read until all parts of
+            # the bot comment were found
+            comments_query = f"""
+                query($owner: String!, $name: String!, $number: Int!, $cursor: String) {{
+                  repository(owner: $owner, name: $name) {{ {COMMENT_FIELDS} }}
+                }}"""
+            variables = {"owner": owner, "name": name, "number": int(self.s.pr_num())}
+            comments = repository["pullRequest"]["comments"]
+            self._comments = [c for c in parse_comments(comments["nodes"]) if c.is_bot_comment()]
+            while comments["pageInfo"]["hasNextPage"] and not found_all_parts([c.body for c in self._comments]):
+                variables = {**variables, "cursor": comments["pageInfo"]["endCursor"]}
+                comments = self.graphql(comments_query, variables)["repository"]["pullRequest"]["comments"]
+                self._comments.extend(c for c in parse_comments(comments["nodes"]) if c.is_bot_comment())
+            self._comments.sort(key=lambda c: (comment_part(c.body), c.id_))
+
+    def _blob(self, ref: str, path: str) -> GraphqlBlob | None:
+        # Returns None for lockfiles that are not covered by the prefetch query
+        self.prefetch()
+        blobs = self._blobs or {}
+        if (ref, path) not in blobs:
+            return None
+        if (blob := blobs[(ref, path)]) is None:
+            raise FileNotFoundError(f"Lockfile {path} not found on branch {ref}")
+        return blob
+
+    def remembered_comments(self) -> list[GithubComment]:
+        self.prefetch()
+        return self._remembered
+
+    def find_comments(self) -> list[GithubComment]:
+        self.prefetch()
+        return self._comments
+
+    def get_file(self, ref: str, path: str | None = None) -> bytes:
+        path = path or self.s.lockfile_path
+        blob = self._blob(ref, path)
+        if blob is None or blob.text is None:
+            return super().get_file(ref, path)
+        return blob.text.encode()
+
+    def get_file_sha(self, ref: str, path: str | None = None) -> str:
+        path = path or self.s.lockfile_path
+        blob = self._blob(ref, path)
+        return blob.oid if blob is not None else super().get_file_sha(ref, path)
+
+
+def parse_comments(nodes: list[dict[str, Any]]) -> list[GithubComment]:
+    # Only comments that may have been posted by the action are validated. Authors of deleted accounts are null, and
+    # only bots and users expose a databaseId.
+    nodes = [node for node in nodes if node["body"].startswith(MAGIC_COMMENT_IDENTIFIER)]
+    users = [{"id": (node["author"] or {}).get("databaseId", 0)} for node in nodes]
+    return [
+        GithubComment(body=node["body"], id=node["databaseId"], user=user)
+        for node, user in zip(nodes, users, strict=True)
+    ]
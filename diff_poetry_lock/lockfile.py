@@ -0,0 +1,77 @@
+import hashlib
+import re
+import sys
+from collections.abc import Iterable, Mapping
+from typing import Any, NamedTuple
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+
+class LockedPackage(NamedTuple):
+    name: str
+    version: str
+    dependencies: tuple[str, ...] = ()  # canonicalized names of the packages this one requires
+    digest: str = ""  # digest of the package's file hashes and source if requested, see artifact_digest
+
+
+def canonicalize_name(name: str) -> str:
+    # PEP 503 normalization, so "Typing_Extensions" and "typing-extensions" refer to the same package
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def full_pretty_version(info: dict[str, Any]) -> str:
+    # Mirrors poetry.core.packages.package.Package.full_pretty_version, without building a Package
+    version: str = info["version"]
+    source: dict[str, str] = info.get("source", {})
+    source_type = source.get("type")
+
+    if source_type in ["file", "directory", "url"]:
+        return f"{version} {source.get('url')}"
+
+    if source_type not in ["hg", "git"]:
+        return version
+
+    resolved_reference = source.get("resolved_reference")
+    reference = source.get("reference")
+    if resolved_reference and len(resolved_reference) == 40:  # noqa: PLR2004
+        return f"{version} {resolved_reference[0:7]}"
+    if reference and len(reference) == 40:  # noqa: PLR2004
+        return f"{version} {reference[0:7]}"
+    return f"{version} {resolved_reference or reference}"
+
+
+def artifact_digest(files: Iterable[Mapping[str, str]], source: Mapping[str, str | None]) -> str:
+    # Changes whenever a wheel is re-published under the same version or the package moves to another source
+    h = hashlib.sha256()
+    for file_hash in sorted(f["hash"] for f in files):
+        h.update(file_hash.encode() + b"\0")
+    for key in ("type", "url", "reference", "resolved_reference", "subdirectory"):
+        h.update((source.get(key) or "").encode() + b"\0")
+    return h.hexdigest()[:16]
+
+
+def load_toml(data: bytes) -> dict[str, Any]:
+    return tomllib.loads(data.decode())
+
+
+def parse_lockfile(data: bytes, *, artifact_digests: bool = False) -> list[LockedPackage]:
+    lock_data = load_toml(data)
+    # Lockfiles before version 2.0 keep the files of all packages in the metadata table
+    metadata_files = lock_data.get("metadata", {}).get("files", {})
+
+    return [
+        LockedPackage(
+            info["name"],
+            full_pretty_version(info),
+            tuple(dict.fromkeys(canonicalize_name(name) for name in info.get("dependencies", {}))),
+            (
+                artifact_digest(info.get("files", metadata_files.get(info["name"], [])), info.get("source", {}))
+                if artifact_digests
+                else ""
+            ),
+        )
+        for info in lock_data.get("package", [])
+    ]
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+# Collects how long each step of a run takes and counts things like requests and bytes. Steps that run concurrently
+# in the worker threads are recorded separately, so the totals of all spans can exceed the wall time of the run.
+class Metrics:
+    def __init__(self) -> None:
+        self.spans: dict[str, list[float]] = defaultdict(list)
+        self.counters: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        with self.span(name):
+            return func(*args, **kwargs)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans[name].append(seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def report(self) -> dict[str, Any]:
+        spans = {
+            name: {
+                "calls": len(seconds),
+                "total_ms": round(sum(seconds) * 1000, 3),
+                "max_ms": round(max(seconds) * 1000, 3),
+            }
+            for name, seconds in self.spans.items()
+        }
+        return {"spans": spans, "counters": dict(sorted(self.counters.items()))}
+
+    def markdown(self) -> str:
+        report = self.report()
+        lines = ["### diff-poetry-lock timings", "", "| Step | Calls | Total | Max |", "| --- | ---: | ---: | ---: |"]
+        lines.extend(
+            f"| {name} | {span['calls']} | {span['total_ms']:.0f} ms | {span['max_ms']:.0f} ms |"
+            for name, span in report["spans"].items()
+        )
+        if report["counters"]:
+            lines.extend(["", ", ".join(f"{name}: {value}" for name, value in report["counters"].items())])
+        return "\n".join(lines) + "\n"
+
+    def write(self, step_summary: str = "", json_path: str = "") -> None:
+        # The job summary is shared with the other steps of the job, so it's appended to
+        if step_summary:
+            with Path(step_summary).open("a") as f:
+                f.write(self.markdown())
+        if json_path:
+            Path(json_path).write_text(json.dumps(self.report(), indent=2) + "\n")
@@ -1,35 +1,110 @@
 import sys
 import tempfile
+import time
+from collections.abc import Collection, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from functools import partial
+from itertools import zip_longest
 from operator import attrgetter
 from pathlib import Path
-
-import pydantic
-from poetry.core.packages.package import Package
-from poetry.packages import Locker
-
-from diff_poetry_lock.github import GithubApi
+from typing import BinaryIO
+
+from diff_poetry_lock.cache import LockfileCache, SharedLockfiles
+from diff_poetry_lock.git import GitRepository
+from diff_poetry_lock.github import MAGIC_COMMENT_IDENTIFIER, GithubApi, GithubComment, part_marker
+from diff_poetry_lock.graph import DependencyGraph, read_root_dependencies
+from diff_poetry_lock.graphql import GithubGraphqlApi
+from diff_poetry_lock.lockfile import LockedPackage, artifact_digest, canonicalize_name, parse_lockfile
+from diff_poetry_lock.metrics import Metrics
 from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.transport import RetryingSession
+from diff_poetry_lock.versions import classify_update
+
+# Github rejects comments longer than this
+MAX_COMMENT_LENGTH = 65536
+# Space kept free in every part of a split comment for its "part i of n" footer and marker
+PART_FOOTER_RESERVE = 64
+DETAILS_END = "\n\n</details>"
+# Comments with more changes show each kind of change in a collapsed <details> block
+MAX_EXPANDED_CHANGES = 50
+
+# requests' connection pool keeps at most 10 connections per host, more workers would not fetch any faster
+MAX_WORKERS = 8
+
+
+def load_packages(
+    source: str | bytes | BinaryIO = "poetry.lock",
+    *,
+    use_locker: bool = False,
+    artifact_digests: bool = False,
+) -> list[LockedPackage]:
+    # The digests of the packages' artifacts are only needed to detect artifact changes, so they are empty otherwise
+    if isinstance(source, str):
+        if use_locker:
+            return load_packages_with_locker(source, artifact_digests=artifact_digests)
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        data = source if isinstance(source, bytes) else source.read()
+
+    if not use_locker:
+        return parse_lockfile(data, artifact_digests=artifact_digests)
+
+    # Locker can only read lockfiles from disk
+    with tempfile.NamedTemporaryFile(mode="wb", delete=True) as f:
+        f.write(data)
+        f.flush()
+        return load_packages_with_locker(f.name, artifact_digests=artifact_digests)
 
 
-def load_packages(filename: str = "poetry.lock") -> list[Package]:
-    l_merged = Locker(Path(filename), local_config={})
-    return l_merged.locked_repository().packages
-
+def load_packages_with_locker(filename: str, *, artifact_digests: bool = False) -> list[LockedPackage]:
+    # Importing poetry takes longer than the whole fast path, so only pay for it when the fallback is requested
+    from poetry.packages import Locker
 
-@pydantic.dataclasses.dataclass(config={"arbitrary_types_allowed": True})
+    l_merged = Locker(Path(filename), local_config={})
+    return [
+        LockedPackage(
+            p.pretty_name,
+            p.full_pretty_version,
+            tuple(dict.fromkeys(canonicalize_name(d.name) for d in p.requires)),
+            (
+                artifact_digest(
+                    p.files,
+                    {
+                        "type": p.source_type,
+                        "url": p.source_url,
+                        "reference": p.source_reference,
+                        "resolved_reference": p.source_resolved_reference,
+                        "subdirectory": p.source_subdirectory,
+                    },
+                )
+                if artifact_digests
+                else ""
+            ),
+        )
+        for p in l_merged.locked_repository().packages
+    ]
+
+
+@dataclass(slots=True)
 class PackageSummary:
     name: str
     old_version: str | None = None
     new_version: str | None = None
+    reason: str | None = None  # why the package is in the lockfile, only set when explaining dependencies
+    artifacts_changed: bool = False  # same version, but different file hashes or source
 
     def not_changed(self) -> bool:
-        return self.new_version == self.old_version
+        return self.new_version == self.old_version and not self.artifacts_changed
 
     def changed(self) -> bool:
         return not self.not_changed()
 
     def updated(self) -> bool:
-        return self.new_version is not None and self.old_version is not None and self.changed()
+        # A version change, packages whose artifacts changed under the same version are republished()
+        return self.new_version is not None and self.old_version is not None and self.new_version != self.old_version
 
     def added(self) -> bool:
         return self.new_version is not None and self.old_version is None
@@ -37,9 +112,37 @@ class PackageSummary:
     def removed(self) -> bool:
         return self.new_version is None and self.old_version is not None
 
+    def republished(self) -> bool:
+        return self.artifacts_changed and self.new_version == self.old_version
+
+    def update_type(self) -> str | None:
+        # How the version changed, see classify_update, None for anything but a version update
+        if self.old_version is None or self.new_version is None or self.old_version == self.new_version:
+            return None
+        return classify_update(self.old_version, self.new_version)
+
+    def change(self) -> str:
+        if self.added():
+            return "added"
+        if self.removed():
+            return "removed"
+        if self.republished():
+            return "artifacts changed"
+        if self.updated():
+            return "updated"
+        return "not changed"
+
     def summary_line(self) -> str:
+        line = self._summary_line()
+        return f"{line} — {self.reason}" if self.reason else line
+
+    def _summary_line(self) -> str:
+        if self.republished():
+            return f"Changed artifacts of **{self.name}** ({self.new_version}): file hashes or source differ"
         if self.updated():
-            return f"Updated **{self.name}** ({self.old_version} -> {self.new_version})"
+            update_type = self.update_type()
+            kind = f", {update_type}" if update_type else ""
+            return f"Updated **{self.name}** ({self.old_version} -> {self.new_version}{kind})"
         if self.added() and self.new_version is not None:
             return f"Added **{self.name}** ({self.new_version})"
         if self.removed() and self.old_version is not None:
@@ -51,74 +154,389 @@ class PackageSummary:
         return f"Not changed **{self.name}** ({self.new_version})"
 
 
-def diff(old_packages: list[Package], new_packages: list[Package]) -> list[PackageSummary]:
-    merged: dict[str, PackageSummary] = {}
-    for package in old_packages:
-        merged[package.pretty_name] = PackageSummary(name=package.pretty_name, old_version=package.full_pretty_version)
-    for package in new_packages:
-        if package.pretty_name not in merged:
-            merged[package.pretty_name] = PackageSummary(
-                name=package.pretty_name,
-                new_version=package.full_pretty_version,
-            )
+def diff(
+    old_packages: list[LockedPackage],
+    new_packages: list[LockedPackage],
+    *,
+    compare_artifacts: bool = False,
+) -> list[PackageSummary]:
+    return list(iter_diff(old_packages, new_packages, compare_artifacts=compare_artifacts))
+
+
+def iter_diff(
+    old_packages: list[LockedPackage],
+    new_packages: list[LockedPackage],
+    *,
+    compare_artifacts: bool = False,
+) -> Iterator[PackageSummary]:
+    old_by_name = {package.name: package for package in old_packages}
+    new_by_name = {package.name: package for package in new_packages}
+
+    # Packages of the old lockfile come first, followed by the ones only present in the new lockfile
+    for name in {**old_by_name, **new_by_name}:
+        old, new = old_by_name.get(name), new_by_name.get(name)
+        summary = PackageSummary(name, old.version if old else None, new.version if new else None)
+        if compare_artifacts and old is not None and new is not None and old.version == new.version:
+            summary.artifacts_changed = old.digest != new.digest
+        yield summary
+
+
+def explain_changes(
+    packages: Iterable[PackageSummary],
+    old_graph: DependencyGraph,
+    new_graph: DependencyGraph,
+) -> Iterator[PackageSummary]:
+    # Removed packages are explained by the old lockfile, everything else by the new one
+    for p in packages:
+        if p.changed():
+            p.reason = (old_graph if p.removed() else new_graph).explain(p.name)
+        yield p
+
+
+def filter_updates(packages: Iterable[PackageSummary], update_types: Collection[str]) -> Iterator[PackageSummary]:
+    # Drops version updates of the types that are not wanted, updates that could not be classified are always kept
+    for p in packages:
+        update_type = p.update_type()
+        if not update_types or update_type is None or update_type in update_types:
+            yield p
+
+
+def post_comment(api: GithubApi, comment: str | None, existing_comments: list[GithubComment]) -> None:
+    # Comments that are too long for Github are posted in parts, each one updating one of the existing comments.
+    # Existing comments that are left over are deleted.
+    parts: list[str | None] = list(split_comment(comment)) if comment else [comment]
+    for existing_comment, part in zip_longest(existing_comments, parts):
+        api.upsert_comment(existing_comment, part)
+
+
+def split_comment(comment: str, max_length: int = MAX_COMMENT_LENGTH) -> list[str]:
+    # Splits at line boundaries in a single pass, and lines that don't fit into a part of their own anywhere. A
+    # <details> block that is cut in two is closed at the end of one part and reopened at the start of the next one.
+    budget = max_length - len(MAGIC_COMMENT_IDENTIFIER) - PART_FOOTER_RESERVE
+    parts: list[str] = []
+    lines: list[str] = []
+    size = 0
+    details: str | None = None
+    for line in split_long_lines(comment, budget):
+        closing = len(DETAILS_END) if details else 0
+        if lines and size + 1 + len(line) + closing > budget:
+            parts.append("\n".join(lines) + (DETAILS_END if details else ""))
+            lines = [details, ""] if details else []
+            size = len(details) + 1 if details else 0
+        size += len(line) + (1 if lines else 0)
+        lines.append(line)
+        if line.startswith("<details>"):
+            details = line
+        elif line == "</details>":
+            details = None
+    parts.append("\n".join(lines))
+
+    if len(parts) == 1:
+        return parts
+    n = len(parts)
+    return [f"{part}\n\n*(part {i} of {n})*\n{part_marker(i, n)}" for i, part in enumerate(parts, 1)]
+
+
+def split_long_lines(comment: str, budget: int) -> Iterator[str]:
+    # Longer lines are cut into pieces that fit into a part together with a reopened <details> tag
+    details: str | None = None
+    for line in comment.split("\n"):
+        limit = budget - len(details) - 2 - len(DETAILS_END) if details else budget
+        if len(line) <= limit:
+            yield line
         else:
-            merged[package.pretty_name].new_version = package.full_pretty_version
-
-    return list(merged.values())
-
-
-def post_comment(api: GithubApi, comment: str | None) -> None:
-    existing_comments = api.list_comments()
+            yield from (line[i : i + limit] for i in range(0, len(line), limit))
+        if line.startswith("<details>"):
+            details = line
+        elif line == "</details>":
+            details = None
+
+
+def format_comment(packages: list[PackageSummary], lockfile_path: str | None = None) -> str | None:
+    # Sort once and classify every package in a single pass, the buckets inherit the order
+    added: list[PackageSummary] = []
+    removed: list[PackageSummary] = []
+    updated: list[PackageSummary] = []
+    republished: list[PackageSummary] = []
+    not_changed = 0
+    for p in sorted(packages, key=attrgetter("name")):
+        if p.not_changed():
+            not_changed += 1
+        elif p.old_version is None:
+            added.append(p)
+        elif p.new_version is None:
+            removed.append(p)
+        elif p.old_version == p.new_version:
+            republished.append(p)
+        else:
+            updated.append(p)
 
-    if len(existing_comments) > 1:
-        print("Found more than one existing comment, only updating first comment", file=sys.stderr)
+    changes = len(added) + len(removed) + len(updated) + len(republished)
+    if changes == 0:
+        return None
 
-    existing_comment = existing_comments[0] if existing_comments else None
-    api.upsert_comment(existing_comment, comment)
+    lockfile = f"`{lockfile_path}`" if lockfile_path else "Poetry lockfile"
+    lines = [f"### Detected {changes} changes to dependencies in {lockfile}\n"]
+    buckets = {"added": added, "removed": removed, "updated": updated, "with changed artifacts": republished}
+    for label, bucket in buckets.items():
+        # Large diffs are collapsed into one block per kind of change to keep the comment readable
+        if changes > MAX_EXPANDED_CHANGES and bucket:
+            lines.extend([f"<details><summary>{len(bucket)} {label}</summary>", ""])
+            lines.extend(p.summary_line() for p in bucket)
+            lines.extend(["", "</details>"])
+        else:
+            lines.extend(p.summary_line() for p in bucket)
+    counts = f"{len(added)} added, {len(removed)} removed, {len(updated)} updated, "
+    if republished:
+        counts += f"{len(republished)} with changed artifacts, "
+    lines.append(f"\n*({counts}{not_changed} not changed)*")
+    return "\n".join(lines)
+
+
+def format_projects_comment(projects: dict[str, list[PackageSummary]]) -> str | None:
+    sections = [format_comment(packages, lockfile_path=path) for path, packages in sorted(projects.items())]
+    return "\n\n".join(section for section in sections if section) or None
+
+
+def load_lockfile(  # noqa: PLR0913
+    api: GithubApi,
+    ref: str,
+    *,
+    use_locker: bool = False,
+    artifact_digests: bool = False,
+    cache: LockfileCache | None = None,
+    path: str | None = None,
+    sha: str | None = None,
+    content: bytes | None = None,
+    shared: SharedLockfiles | None = None,
+) -> list[LockedPackage]:
+    # Lockfiles parsed with and without artifact digests are kept apart
+    variant = f"{'locker' if use_locker else 'toml'}{'-digests' if artifact_digests else ''}"
+    if shared is not None and sha is not None:
+        load = partial(
+            load_lockfile,
+            api,
+            ref,
+            use_locker=use_locker,
+            artifact_digests=artifact_digests,
+            cache=cache,
+            path=path,
+            sha=sha,
+            content=content,
+        )
+        return shared.load(f"{sha}-{variant}", load)
+
+    # content is the lockfile if it was already read from a local repository, otherwise it's downloaded
+    if cache is not None:
+        key = f"{sha or api.get_file_sha(ref, path)}-{variant}"
+        if (packages := cache.get(key)) is not None:
+            print(f"Loaded lockfile {path or api.s.lockfile_path} on {ref} from cache")
+            api.metrics.count("lockfile_cache_hits")
+            return packages
+
+    if content is None:
+        content = api.metrics.timed("get_file", api.get_file, ref, path)
+    packages = api.metrics.timed(
+        "load_packages",
+        load_packages,
+        content,
+        use_locker=use_locker,
+        artifact_digests=artifact_digests,
+    )
+    if cache is not None:
+        cache.put(key, packages)
+    return packages
 
 
-def format_comment(packages: list[PackageSummary]) -> str | None:
-    added = sorted([p for p in packages if p.added()], key=attrgetter("name"))
-    removed = sorted([p for p in packages if p.removed()], key=attrgetter("name"))
-    updated = sorted([p for p in packages if p.updated()], key=attrgetter("name"))
-    not_changed = sorted([p for p in packages if p.not_changed()], key=attrgetter("name"))
+def resolve_lockfiles(api: GithubApi, ref: str, repo: GitRepository | None = None) -> dict[str, str]:
+    # Maps the path of every lockfile on the ref to its blob SHA, preferring the local repository over the API
+    commit = repo.resolve(ref) if repo is not None else None
+    if repo is None or commit is None:
+        if not api.s.multiple_lockfiles():
+            return {api.s.lockfile_path: api.get_file_sha(ref)}
+        tree = api.get_tree(ref)
+    elif not api.s.multiple_lockfiles():
+        tree = repo.ls_tree(commit, [api.s.lockfile_path])
+        if api.s.lockfile_path not in tree:
+            raise FileNotFoundError(f"Lockfile {api.s.lockfile_path} not found on branch {ref}")
+        return tree
+    else:
+        tree = repo.ls_tree(commit)
 
-    if len(added + removed + updated) == 0:
-        return None
+    patterns = api.s.lockfile_paths()
+    return {path: sha for path, sha in tree.items() if any(fnmatch(path, p) for p in patterns)}
 
-    comment = f"### Detected {len(added + removed + updated)} changes to dependencies in Poetry lockfile\n\n"
-    comment += "\n".join(p.summary_line() for p in added + removed + updated)
-    comment += (
-        f"\n\n*({len(added)} added, {len(removed)} removed, {len(updated)} updated, {len(not_changed)} not changed)*"
-    )
 
-    return comment
+def load_roots(api: GithubApi, ref: str, path: str, repo: GitRepository | None = None) -> set[str]:
+    # The direct dependencies from the pyproject.toml next to the lockfile, empty if there is none
+    commit = repo.resolve(ref) if repo is not None else None
+    if repo is None or commit is None:
+        return read_root_dependencies(partial(api.get_file, ref), path)
 
+    def read_blob(pyproject: str) -> bytes:
+        if (sha := repo.ls_tree(commit, [pyproject]).get(pyproject)) is None:
+            raise FileNotFoundError(f"{pyproject} not found on branch {ref}")
+        return repo.read_blobs([sha])[sha]
 
-def load_lockfile(api: GithubApi, ref: str) -> list[Package]:
-    r = api.get_file(ref)
-    with tempfile.NamedTemporaryFile(mode="wb", delete=True) as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            f.write(chunk)
-        f.flush()
-
-        return load_packages(f.name)
+    return read_root_dependencies(read_blob, path)
 
 
 def main() -> None:
     settings = Settings()
     print(settings)
-    do_diff(settings)
-
-
-def do_diff(settings: Settings) -> None:
-    api = GithubApi(settings)
-    base_packages = load_lockfile(api, settings.base_ref)
-    head_packages = load_lockfile(api, settings.ref)
+    if settings.batch:
+        run_batch(settings)
+    else:
+        do_diff(settings)
+
+
+def do_diff(settings: Settings, api: GithubApi | None = None, shared: SharedLockfiles | None = None) -> None:
+    start = time.perf_counter()
+    own_api = api is None
+    if api is None:
+        api = GithubGraphqlApi(settings) if settings.api_transport == "graphql" else GithubApi(settings)
+    cache = LockfileCache(settings.cache_dir, settings.cache_max_bytes) if settings.cache_dir else None
+    repo = GitRepository(settings.git_repository) if settings.git_repository else None
+    load = partial(
+        load_lockfile,
+        api,
+        use_locker=settings.use_poetry_locker,
+        artifact_digests=settings.detect_artifact_changes,
+        cache=cache,
+    )
 
-    packages = diff(base_packages, head_packages)
-    summary = format_comment(packages)
-    post_comment(api, summary)
+    # The lockfile downloads and the comment listing are independent of each other, so run them concurrently
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        comments_future = executor.submit(api.metrics.timed, "list_comments", api.list_comments)
+        base_shas_future = executor.submit(resolve_lockfiles, api, settings.base_ref, repo)
+        head_shas_future = executor.submit(resolve_lockfiles, api, settings.ref, repo)
+        base_shas, head_shas = base_shas_future.result(), head_shas_future.result()
+
+        # Lockfiles with the same blob SHA on both refs are skipped without downloading or parsing them
+        changed = sorted(
+            path for path in base_shas.keys() | head_shas.keys() if base_shas.get(path) != head_shas.get(path)
+        )
+        if not changed:
+            print("Lockfile is identical on both branches, skipping diff")
+
+        # Small lockfiles came along with their blob SHA, blobs present in the local repository are read by a single git
+        # process and the rest is downloaded
+        blobs = api.take_contents()
+        shas = [shas[path] for shas in (base_shas, head_shas) for path in changed if path in shas]
+        if repo is not None:
+            blobs |= repo.read_blobs([sha for sha in shas if sha not in blobs])
+
+        base_futures = {
+            # Only base lockfiles are shared in batch runs, a head lockfile belongs to a single pull request
+            path: executor.submit(load, settings.base_ref, path=path, sha=sha, content=blobs.get(sha), shared=shared)
+            for path in changed
+            if (sha := base_shas.get(path)) is not None
+        }
+        head_futures = {
+            path: executor.submit(load, settings.ref, path=path, sha=sha, content=blobs.get(sha))
+            for path in changed
+            if (sha := head_shas.get(path)) is not None
+        }
+        roots_futures = {}
+        if settings.explain_dependencies:
+            roots_futures = {
+                (ref, path): executor.submit(load_roots, api, ref, path, repo)
+                for ref, futures in ((settings.base_ref, base_futures), (settings.ref, head_futures))
+                for path in futures
+            }
+
+        projects = {}
+        for path in changed:
+            old = base_futures[path].result() if path in base_futures else []
+            new = head_futures[path].result() if path in head_futures else []
+            with api.metrics.span("diff"):
+                projects[path] = diff(old, new, compare_artifacts=settings.detect_artifact_changes)
+            if settings.explain_dependencies:
+                old_roots = roots_futures[(settings.base_ref, path)].result() if path in base_futures else set()
+                new_roots = roots_futures[(settings.ref, path)].result() if path in head_futures else set()
+                graphs = DependencyGraph(old, old_roots), DependencyGraph(new, new_roots)
+                projects[path] = list(explain_changes(projects[path], *graphs))
+            if settings.update_types:
+                projects[path] = list(filter_updates(projects[path], settings.update_type_filter()))
+
+        existing_comments = comments_future.result()
+
+    with api.metrics.span("format_comment"):
+        if settings.multiple_lockfiles():
+            summary = format_projects_comment(projects)
+        else:
+            summary = format_comment(projects[settings.lockfile_path]) if projects else None
+    with api.metrics.span("upsert_comment"):
+        post_comment(api, summary, existing_comments)
+
+    # Batch runs report once for all pull requests
+    if own_api:
+        report(settings, [api], time.perf_counter() - start)
+
+
+def run_batch(settings: Settings) -> None:
+    # Diffs the open pull requests of all configured repositories, at most batch_workers at a time, with a single
+    # session. Base lockfiles are shared by blob SHA between pull requests, so a common base branch is fetched only
+    # once.
+    start = time.perf_counter()
+    # Every pull request in flight fetches with up to MAX_WORKERS threads of its own
+    pool_size = max(settings.http_pool_size, settings.batch_workers * MAX_WORKERS)
+    session = RetryingSession(retries=settings.http_retries, pool_size=pool_size)
+    metrics = Metrics()
+    shared = SharedLockfiles()
+    api_class = GithubGraphqlApi if settings.api_transport == "graphql" else GithubApi
+
+    pulls: list[tuple[GithubApi, str]] = []
+    for repository in settings.repository_names():
+        repository_api = GithubApi(settings.copy(update={"repository": repository}), session, metrics)
+        pulls.extend(
+            (api_class(settings.for_pull_request(repository, number, base_ref), session, metrics), head_sha)
+            for number, base_ref, head_sha in repository_api.list_pull_requests()
+        )
+    apis = [api for api, _ in pulls]
+    print(f"Diffing {len(apis)} open pull requests")
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=settings.batch_workers) as executor:
+        futures = [(api, executor.submit(diff_pull_request, api, head_sha, shared)) for api, head_sha in pulls]
+        for api, future in futures:
+            try:
+                future.result()
+            except Exception as ex:  # noqa: BLE001
+                # A single broken pull request should not stop the others from being diffed
+                print(f"Diffing {api.s.repository}#{api.s.pr_num()} failed: {ex!r}", file=sys.stderr)
+                failures += 1
+
+    report(settings, apis, time.perf_counter() - start)
+    if failures:
+        print(f"Failed to diff {failures} of {len(apis)} pull requests", file=sys.stderr)
+        sys.exit(1)
+
+
+def diff_pull_request(api: GithubApi, head_sha: str, shared: SharedLockfiles) -> None:
+    if not api.has_ref(api.s.ref):
+        print(f"{api.s.repository}#{api.s.pr_num()} has no merge ref, diffing its head against the merge base")
+        api.s = api.s.for_pull_request_head(api.merge_base(api.s.base_ref, head_sha))
+    do_diff(api.s, api, shared)
+
+
+def report(settings: Settings, apis: list[GithubApi], seconds: float) -> None:
+    # All clients of a run share the same session and metrics, only their ETag caches are separate
+    if not apis:
+        return
+    session, metrics = apis[0].session, apis[0].metrics
+    print(session.summary())
+    metrics.record("total", seconds)
+    metrics.count("requests", len(session.timings))
+    metrics.count("retries", session.retried)
+    metrics.count("bytes_sent", sum(t.sent for t in session.timings))
+    metrics.count("bytes_received", sum(t.received for t in session.timings))
+    if etags := [api.etags for api in apis if api.etags is not None]:
+        hits, misses = sum(e.hits for e in etags), sum(e.misses for e in etags)
+        print(f"ETag cache: {hits} hits, {misses} misses")
+        metrics.count("etag_hits", hits)
+        metrics.count("etag_misses", misses)
+    metrics.write(settings.step_summary, settings.metrics_file)
 
 
 if __name__ == "__main__":
@@ -3,32 +3,105 @@ from typing import Any
 
 from pydantic import BaseSettings, Field, ValidationError, validator
 
+from diff_poetry_lock.versions import parse_update_types
+
 
 class Settings(BaseSettings):
-    event_name: str = Field(env="github_event_name")  # must be 'pull_request'
-    ref: str = Field(env="github_ref")
+    batch: bool = Field(env="input_batch", default=False)  # diff all open pull requests, validated before the rest
+    event_name: str = Field(env="github_event_name")  # must be 'pull_request', unless in batch mode
+    ref: str = Field(env="github_ref", default="")
     repository: str = Field(env="github_repository")
     token: str = Field(env="input_github_token")
-    base_ref: str = Field(env="github_base_ref")
+    base_ref: str = Field(env="github_base_ref", default="")
     lockfile_path: str = Field(env="input_lockfile_path", default="poetry.lock")
     api_url: str = Field(env="github_api_url", default="https://api.github.com")
+    use_poetry_locker: bool = Field(env="input_use_poetry_locker", default=False)
+    api_transport: str = Field(env="input_api_transport", default="rest")
+    graphql_url: str = Field(env="github_graphql_url", default="https://api.github.com/graphql")
+    detect_artifact_changes: bool = Field(env="input_detect_artifact_changes", default=False)
+    explain_dependencies: bool = Field(env="input_explain_dependencies", default=False)
+    git_repository: str = Field(env="input_git_repository", default="")
+    cache_dir: str = Field(env="input_cache_dir", default="")
+    cache_max_bytes: int = Field(env="input_cache_max_bytes", default=64 * 1024 * 1024)
+    http_retries: int = Field(env="input_http_retries", default=3)
+    http_pool_size: int = Field(env="input_http_pool_size", default=10)
+    step_summary: str = Field(env="github_step_summary", default="")
+    metrics_file: str = Field(env="input_metrics_file", default="")
+    repositories: str = Field(env="input_repositories", default="")
+    batch_workers: int = Field(env="input_batch_workers", default=4)
+    update_types: str = Field(env="input_update_types", default="")
 
     def __init__(self, **values: Any) -> None:  # noqa: ANN401
         try:
             super().__init__(**values)
         except ValidationError as ex:
-            if e1 := next(e.exc for e in ex.raw_errors if e.loc_tuple() == ("event_name",)):  # type: ignore[union-attr]
+            event_errors = (e.exc for e in ex.raw_errors if e.loc_tuple() == ("event_name",))  # type: ignore[union-attr]
+            if e1 := next(event_errors, None):
                 # event_name is not 'pull_request' - we fail early
                 print(str(e1), file=sys.stderr)
                 sys.exit(0)
             raise
 
     @validator("event_name")
-    def event_must_be_pull_request(cls, v: str) -> str:  # noqa: N805
-        if v != "pull_request":
+    def event_must_be_pull_request(cls, v: str, values: dict[str, Any]) -> str:  # noqa: N805
+        if v != "pull_request" and not values.get("batch"):
             raise ValueError("This Github Action can only be run in the context of a pull request")
         return v
 
+    @validator("ref", "base_ref", always=True)
+    def pull_request_refs_must_be_set(cls, v: str, values: dict[str, Any]) -> str:  # noqa: N805
+        # In batch mode the refs are taken from the listed pull requests instead
+        if not v and not values.get("batch"):
+            raise ValueError("field required")
+        return v
+
+    @validator("api_transport")
+    def api_transport_must_be_known(cls, v: str) -> str:  # noqa: N805
+        if v not in ("rest", "graphql"):
+            raise ValueError("api_transport must be either 'rest' or 'graphql'")
+        return v
+
+    @validator("update_types")
+    def update_types_must_be_known(cls, v: str) -> str:  # noqa: N805
+        parse_update_types(v)
+        return v
+
+    def update_type_filter(self) -> list[str]:
+        # The kinds of version updates to show in the comment, all of them if empty
+        return parse_update_types(self.update_types)
+
+    def lockfile_paths(self) -> list[str]:
+        # lockfile_path may hold several paths or glob patterns, separated by commas or newlines
+        return [p.strip() for p in self.lockfile_path.replace(",", "\n").splitlines() if p.strip()]
+
+    def multiple_lockfiles(self) -> bool:
+        paths = self.lockfile_paths()
+        return len(paths) > 1 or any(c in path for path in paths for c in "*?[")
+
+    def repository_names(self) -> list[str]:
+        # Batch mode diffs the open pull requests of these repositories, separated by commas or newlines
+        names = [r.strip() for r in self.repositories.replace(",", "\n").splitlines() if r.strip()]
+        return names or [self.repository]
+
+    def for_pull_request(self, repository: str, number: int, base_ref: str) -> "Settings":
+        # Like in a pull_request run, the merge ref is diffed against the base branch. The local checkout only holds
+        # the repository the action runs in, so the others are read through the API.
+        git_repository = self.git_repository if repository == self.repository else ""
+        return self.copy(
+            update={
+                "batch": False,
+                "repository": repository,
+                "ref": f"refs/pull/{number}/merge",
+                "base_ref": base_ref,
+                "git_repository": git_repository,
+            },
+        )
+
+    def for_pull_request_head(self, merge_base: str) -> "Settings":
+        # Pull requests with conflicts have no merge ref, so their head is diffed against the commit it branched off
+        # from. Against the tip of the base branch, changes that landed there since would show up reversed.
+        return self.copy(update={"ref": f"refs/pull/{self.pr_num()}/head", "base_ref": merge_base})
+
     def pr_num(self) -> str:
         # TODO: Validate early
         return self.ref.split("/")[2]
@@ -0,0 +1,73 @@
+import hashlib
+from typing import Any
+
+from requests_mock import Mocker
+
+from diff_poetry_lock.settings import Settings
+
+# Lockfiles and request mocks shared by the tests and the benchmarks
+
+TESTFILE_1 = "diff_poetry_lock/test/res/poetry1.lock"
+TESTFILE_2 = "diff_poetry_lock/test/res/poetry2.lock"
+
+
+def load_file(filename: str) -> bytes:
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def mock_list_comments(m: Mocker, s: Settings, response_json: list[dict[Any, Any]], last_page: int = 1) -> None:
+    # Mocks the first page of comments, which links to the last one if there are more
+    url = f"{s.api_url}/repos/{s.repository}/issues/{s.pr_num()}/comments?per_page=100"
+    headers = {"Authorization": f"Bearer {s.token}", "Accept": "application/vnd.github.raw"}
+    if last_page > 1:
+        headers["Link"] = f'<{url}&page=2>; rel="next", <{url}&page={last_page}>; rel="last"'
+    m.get(f"{url}&page=1", headers=headers, json=response_json)
+
+
+def mock_get_file(m: Mocker, s: Settings, data: bytes, ref: str) -> None:
+    mock_get_file_sha(m, s, data, ref)
+    m.get(
+        f"{s.api_url}/repos/{s.repository}/contents/{s.lockfile_path}?ref={ref}",
+        request_headers={"Accept": "application/vnd.github.raw"},
+        headers={"Authorization": f"Bearer {s.token}", "Accept": "application/vnd.github.raw"},
+        content=data,
+    )
+
+
+def mock_get_file_sha(m: Mocker, s: Settings, data: bytes | None, ref: str) -> None:
+    # The metadata of the lockfile, without its content like Github does for files over 1 MB
+    url = f"{s.api_url}/repos/{s.repository}/contents/{s.lockfile_path}?ref={ref}"
+    accept = {"Accept": "application/vnd.github.object"}
+    if data is None:
+        m.get(url, request_headers=accept, status_code=404)
+    else:
+        entry = {"name": s.lockfile_path, "type": "file", "sha": blob_sha(data), "encoding": "none", "content": ""}
+        m.get(url, request_headers=accept, json=entry)
+
+
+def is_download(r: Any) -> bool:  # noqa: ANN401
+    # Whether a mocked request downloaded the content of a file, rather than its metadata
+    return "/contents/" in r.path and r.headers.get("Accept") == "application/vnd.github.raw"
+
+
+def blob_sha(data: bytes) -> str:
+    return hashlib.sha1(f"blob {len(data)}\0".encode() + data).hexdigest()  # noqa: S324
+
+
+def create_settings(
+    repository: str = "user/repo",
+    lockfile_path: str = "poetry.lock",
+    token: str = "foobar",  # noqa: S107
+    api_url: str = "http://localhost/github_api",
+) -> Settings:
+    return Settings(
+        event_name="pull_request",
+        ref="refs/pull/1/merge",
+        repository=repository,
+        token=token,
+        base_ref="main",
+        lockfile_path=lockfile_path,
+        api_url=api_url,
+        step_summary="",  # tests running in Github Actions must not write to the job summary
+    )
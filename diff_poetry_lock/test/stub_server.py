@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlsplit
+
+StubResponse = tuple[int, dict[str, str], bytes]
+StubHandler = Callable[[BaseHTTPRequestHandler], StubResponse]
+
+
+# A local HTTP server standing in for the Github API, with an optional delay injected into every request
+class StubGithubServer:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.routes: dict[tuple[str, str], StubHandler] = {}
+        self.requests: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def route(self, method: str, path: str, handler: StubHandler) -> None:
+        self.routes[(method, path)] = handler
+
+    def route_json(self, method: str, path: str, data: Any, status: int = 200) -> None:  # noqa: ANN401
+        body = json.dumps(data).encode()
+        self.route(method, path, lambda _: (status, {"Content-Type": "application/json"}, body))
+
+    def route_bytes(self, method: str, path: str, data: bytes, status: int = 200) -> None:
+        self.route(method, path, lambda _: (status, {}, data))
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            request_body = b""
+
+            def _dispatch(self) -> None:
+                path = urlsplit(self.path).path
+                self.request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.requests.append((self.command, self.path))
+                time.sleep(server.delay)
+
+                handler = server.routes.get((self.command, path))
+                status, headers, body = handler(self) if handler else (404, {}, b"")
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _dispatch  # noqa: N815
+
+            def log_message(self, *args: Any) -> None:  # noqa: ANN401
+                pass
+
+        return Handler
+
+    @contextmanager
+    def running(self) -> Iterator["StubGithubServer"]:
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,128 @@
+import pytest
+import requests_mock
+from _pytest.monkeypatch import MonkeyPatch
+from requests_mock import Mocker
+
+from diff_poetry_lock.run_poetry import run_batch
+from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    create_settings,
+    is_download,
+    load_file,
+    mock_get_file,
+    mock_get_file_sha,
+    mock_list_comments,
+)
+
+
+def mock_pull_requests(m: Mocker, s: Settings, pulls: dict[int, str], *, merge_refs: bool = True) -> None:
+    # Open pull requests by number and base branch, all of them with or without a merge ref
+    m.get(
+        f"{s.api_url}/repos/{s.repository}/pulls?state=open&per_page=100&page=1",
+        json=[{"number": n, "base": {"ref": base}, "head": {"sha": f"head{n}"}} for n, base in pulls.items()],
+    )
+    for number in pulls:
+        m.get(f"{s.api_url}/repos/{s.repository}/git/ref/pull/{number}/merge", status_code=200 if merge_refs else 404)
+
+
+def test_batch_settings(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("GITHUB_EVENT_NAME", "schedule")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "account/repo")
+    monkeypatch.setenv("INPUT_GITHUB_TOKEN", "foobar")
+    monkeypatch.setenv("INPUT_BATCH", "true")
+    monkeypatch.setenv("INPUT_REPOSITORIES", "account/repo, account/b")
+    monkeypatch.setenv("INPUT_GIT_REPOSITORY", ".")
+
+    s = Settings()
+
+    assert s.repository_names() == ["account/repo", "account/b"]
+    pr = s.for_pull_request("account/b", 7, "develop")
+    assert (pr.repository, pr.ref, pr.pr_num(), pr.base_ref, pr.batch) == (
+        "account/b",
+        "refs/pull/7/merge",
+        "7",
+        "develop",
+        False,
+    )
+    # The local checkout belongs to account/repo only
+    assert pr.git_repository == ""
+    assert s.for_pull_request("account/repo", 8, "main").git_repository == "."
+    head = pr.for_pull_request_head("0123abc")
+    assert (head.ref, head.pr_num(), head.base_ref) == ("refs/pull/7/head", "7", "0123abc")
+
+
+def test_batch_shares_base_lockfile() -> None:
+    cfg = create_settings()
+    cfg.batch = True
+    base, head1, head2 = load_file(TESTFILE_1), load_file(TESTFILE_2), load_file(TESTFILE_2) + b"\n"
+
+    with requests_mock.Mocker() as m:
+        mock_pull_requests(m, cfg, {1: "main", 2: "main"})
+        for number, head in ((1, head1), (2, head2)):
+            pr = cfg.for_pull_request(cfg.repository, number, "main")
+            mock_get_file(m, pr, base, pr.base_ref)
+            mock_get_file(m, pr, head, pr.ref)
+            mock_list_comments(m, pr, [])
+            m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{number}/comments")
+
+        run_batch(cfg)
+
+        downloads = sorted(r.qs["ref"][0] for r in m.request_history if is_download(r))
+        posts = sorted(r.path for r in m.request_history if r.method == "POST")
+
+    assert downloads == ["main", "refs/pull/1/merge", "refs/pull/2/merge"]
+    assert posts == ["/github_api/repos/user/repo/issues/1/comments", "/github_api/repos/user/repo/issues/2/comments"]
+
+
+def test_batch_continues_after_failure() -> None:
+    cfg = create_settings()
+    cfg.batch = True
+
+    with requests_mock.Mocker() as m:
+        mock_pull_requests(m, cfg, {1: "main", 2: "gone"})
+        pr = cfg.for_pull_request(cfg.repository, 1, "main")
+        mock_get_file(m, pr, load_file(TESTFILE_1), pr.base_ref)
+        mock_get_file(m, pr, load_file(TESTFILE_2), pr.ref)
+        mock_list_comments(m, pr, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/1/comments")
+        pr = cfg.for_pull_request(cfg.repository, 2, "gone")
+        mock_get_file_sha(m, pr, None, pr.base_ref)
+        mock_get_file(m, pr, load_file(TESTFILE_2), pr.ref)
+        mock_list_comments(m, pr, [])
+
+        with pytest.raises(SystemExit) as exit_info:
+            run_batch(cfg)
+
+        assert exit_info.value.code == 1
+        assert [r.path for r in m.request_history if r.method == "POST"] == [
+            "/github_api/repos/user/repo/issues/1/comments",
+        ]
+
+
+def test_batch_pull_request_without_merge_ref() -> None:
+    cfg = create_settings()
+    cfg.batch = True
+    pr = cfg.for_pull_request(cfg.repository, 3, "main").for_pull_request_head("base3")
+
+    with requests_mock.Mocker() as m:
+        # The pull request has conflicts, so Github has no merge ref for it
+        mock_pull_requests(m, cfg, {3: "main"}, merge_refs=False)
+        m.get(
+            f"{cfg.api_url}/repos/{cfg.repository}/compare/main...head3?per_page=1",
+            json={"merge_base_commit": {"sha": "base3"}},
+        )
+        mock_get_file(m, pr, load_file(TESTFILE_1), pr.base_ref)
+        mock_get_file(m, pr, load_file(TESTFILE_2), pr.ref)
+        mock_list_comments(m, pr, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/3/comments")
+
+        run_batch(cfg)
+
+        downloads = sorted(r.qs["ref"][0] for r in m.request_history if is_download(r))
+        posts = [r.path for r in m.request_history if r.method == "POST"]
+
+    # The head is diffed against the merge base, not against the current tip of main
+    assert downloads == ["base3", "refs/pull/3/head"]
+    assert posts == ["/github_api/repos/user/repo/issues/3/comments"]
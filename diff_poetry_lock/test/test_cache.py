@@ -0,0 +1,123 @@
+import os
+from pathlib import Path
+
+import requests_mock
+
+from diff_poetry_lock.cache import CACHE_VERSION, LockfileCache
+from diff_poetry_lock.github import MAGIC_BOT_USER_ID, MAGIC_COMMENT_IDENTIFIER, GithubApi
+from diff_poetry_lock.lockfile import LockedPackage
+from diff_poetry_lock.run_poetry import do_diff, load_packages
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    create_settings,
+    is_download,
+    load_file,
+    mock_get_file,
+    mock_list_comments,
+)
+
+
+def test_cache_roundtrip(tmp_path: Path) -> None:
+    cache = LockfileCache(tmp_path, max_bytes=1024 * 1024)
+    packages = load_packages(TESTFILE_1)
+
+    assert cache.get("abc") is None
+    cache.put("abc", packages)
+    assert cache.get("abc") == packages
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    packages = [LockedPackage(f"package-{i}", "1.0.0") for i in range(10)]
+    cache = LockfileCache(tmp_path, max_bytes=1024 * 1024)
+    cache.put("first", packages)
+    cache.put("second", packages)
+    os.utime(tmp_path / f"v{CACHE_VERSION}-first.json", (0, 0))
+    os.utime(tmp_path / f"v{CACHE_VERSION}-second.json", (1, 1))
+    cache.get("first")
+
+    entry_size = (tmp_path / f"v{CACHE_VERSION}-first.json").stat().st_size
+    cache.max_bytes = 2 * entry_size
+    cache.put("third", packages)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == packages
+    assert cache.get("third") == packages
+
+
+def test_e2e_cached_lockfile_is_not_downloaded(tmp_path: Path) -> None:
+    cfg = create_settings()
+    cfg.cache_dir = str(tmp_path)
+
+    with requests_mock.Mocker() as m:
+        mock_get_file(m, cfg, load_file(TESTFILE_1), cfg.base_ref)
+        mock_get_file(m, cfg, load_file(TESTFILE_2), cfg.ref)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments", json={"id": 1})
+        m.get(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/1", status_code=404)
+
+        do_diff(cfg)
+        downloads = [r for r in m.request_history if is_download(r)]
+        assert len(downloads) == 2
+
+        do_diff(cfg)
+        assert [r for r in m.request_history if is_download(r)] == downloads
+
+
+def test_etag_cache_reuses_body_on_not_modified(tmp_path: Path) -> None:
+    cfg = create_settings()
+    cfg.cache_dir = str(tmp_path)
+    data = load_file(TESTFILE_1)
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}?ref={cfg.ref}",
+            [{"content": data, "headers": {"ETag": '"abc"', "Content-Type": "text/plain"}}, {"status_code": 304}],
+        )
+
+        assert GithubApi(cfg).get_file(cfg.ref) == data
+
+        api = GithubApi(cfg)
+        r = api.get(
+            f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}",
+            params={"ref": cfg.ref},
+            accept="application/vnd.github.raw",
+        )
+        assert (r.status_code, r.content, r.headers["Content-Type"]) == (200, data, "text/plain")
+        assert m.last_request.headers["If-None-Match"] == '"abc"'
+        assert api.etags is not None
+        assert (api.etags.hits, api.etags.misses) == (1, 0)
+
+
+def test_comment_id_is_remembered(tmp_path: Path) -> None:
+    cfg = create_settings()
+    cfg.cache_dir = str(tmp_path)
+    comment = {
+        "id": 1337,
+        "body": f"{MAGIC_COMMENT_IDENTIFIER}foobar",
+        "user": {"id": MAGIC_BOT_USER_ID},
+        "issue_url": f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}",
+    }
+    others = [{"id": i, "body": "LGTM", "user": {"id": 1}} for i in range(100)]
+
+    with requests_mock.Mocker() as m:
+        mock_list_comments(m, cfg, others, last_page=2)
+        m.get(
+            f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments?per_page=100&page=2",
+            json=[*others[:10], comment],
+        )
+        m.get(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/1337", json=comment)
+
+        assert [c.id_ for c in GithubApi(cfg).list_comments()] == [1337]
+        assert m.call_count == 2
+
+        # The next run fetches the remembered comment instead of listing all comments
+        assert [c.id_ for c in GithubApi(cfg).list_comments()] == [1337]
+        assert m.call_count == 3
+        assert m.last_request.path.endswith("/issues/comments/1337")
+
+        m.delete(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/1337")
+        GithubApi(cfg).delete_comment(1337)
+        m.reset_mock()
+        GithubApi(cfg).list_comments()
+        assert m.call_count == 2
@@ -0,0 +1,78 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from _pytest.capture import CaptureFixture
+
+from diff_poetry_lock.cli import main
+from diff_poetry_lock.test.helpers import TESTFILE_1, TESTFILE_2, load_file
+
+
+def test_cli_json_lines(capsys: CaptureFixture[str]) -> None:
+    assert main([TESTFILE_1, TESTFILE_2]) == 0
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records == [
+        {"name": "pydantic", "change": "removed", "old_version": "1.10.6", "new_version": None},
+        {"name": "typing-extensions", "change": "removed", "old_version": "4.5.0", "new_version": None},
+        {
+            "name": "urllib3",
+            "change": "updated",
+            "old_version": "1.26.15",
+            "new_version": "1.26.14",
+            "update_type": "downgrade",
+        },
+    ]
+
+
+def test_cli_json_all(capsys: CaptureFixture[str]) -> None:
+    assert main([TESTFILE_2, TESTFILE_2, "--format", "json", "--all"]) == 0
+
+    records = json.loads(capsys.readouterr().out)
+    assert len(records) == 5
+    assert {r["change"] for r in records} == {"not changed"}
+
+
+def test_cli_detect_artifact_changes(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    republished = tmp_path / "poetry.lock"
+    republished.write_bytes(
+        load_file(TESTFILE_2).replace(b"90b77e79eaa3eba6de819a0c442c0b4ceefc341a7a2ab77d7562bf49f425c5c2", b"0" * 64),
+    )
+
+    assert main([TESTFILE_2, str(republished)]) == 0
+    assert capsys.readouterr().out == ""
+
+    assert main([TESTFILE_2, str(republished), "--detect-artifact-changes"]) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(r["name"], r["change"]) for r in records] == [("idna", "artifacts changed")]
+
+
+def test_cli_unknown_update_types(capsys: CaptureFixture[str]) -> None:
+    with pytest.raises(SystemExit) as ex:
+        main([TESTFILE_1, TESTFILE_2, "--update-types", "major,majr"])
+
+    assert ex.value.code == 2
+    assert "Unknown update types majr" in capsys.readouterr().err
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_cli_git_refs(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)  # noqa: S603, S607
+
+    git("init", "-b", "main")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    shutil.copy(TESTFILE_2, tmp_path / "poetry.lock")
+    git("add", "poetry.lock")
+    git("commit", "-m", "base")
+    git("tag", "base")
+    shutil.copy(TESTFILE_1, tmp_path / "poetry.lock")
+    git("commit", "-am", "head")
+
+    assert main(["base", "HEAD", "--repo", str(tmp_path), "--format", "markdown"]) == 0
+    assert capsys.readouterr().out.startswith("### Detected 3 changes to dependencies in Poetry lockfile")
+
+    assert main(["base", "missing-ref", "--repo", str(tmp_path)]) == 2
@@ -0,0 +1,38 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from diff_poetry_lock.run_poetry import do_diff
+from diff_poetry_lock.test.helpers import TESTFILE_1, TESTFILE_2, blob_sha, create_settings, load_file
+from diff_poetry_lock.test.stub_server import StubGithubServer, StubResponse
+
+DELAY = 0.3
+
+
+def test_do_diff_fetches_concurrently() -> None:
+    server = StubGithubServer(delay=DELAY)
+    cfg = create_settings(api_url=server.url)
+    lockfiles = {cfg.base_ref: load_file(TESTFILE_1), cfg.ref: load_file(TESTFILE_2)}
+
+    def ref(h: BaseHTTPRequestHandler) -> str:
+        return parse_qs(urlsplit(h.path).query)["ref"][0]
+
+    def lockfile(h: BaseHTTPRequestHandler) -> StubResponse:
+        if h.headers["Accept"] == "application/vnd.github.object":
+            entry = {"name": cfg.lockfile_path, "type": "file", "sha": blob_sha(lockfiles[ref(h)])}
+            return 200, {}, json.dumps(entry).encode()
+        return 200, {}, lockfiles[ref(h)]
+
+    server.route("GET", f"/repos/{cfg.repository}/contents/{cfg.lockfile_path}", lockfile)
+    server.route_json("GET", f"/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments", [])
+    server.route_json("POST", f"/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments", {}, status=201)
+
+    with server.running():
+        start = time.perf_counter()
+        do_diff(cfg)
+        elapsed = time.perf_counter() - start
+
+    assert len(server.requests) == 6
+    # sequential fetching would take at least 6 * DELAY, concurrent fetching takes three round trips
+    assert elapsed < 4.5 * DELAY
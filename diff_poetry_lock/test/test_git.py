@@ -0,0 +1,88 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+import requests_mock
+
+from diff_poetry_lock.git import GitRepository
+from diff_poetry_lock.github import MAGIC_COMMENT_IDENTIFIER
+from diff_poetry_lock.run_poetry import diff, do_diff, format_comment, load_packages
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    blob_sha,
+    create_settings,
+    is_download,
+    load_file,
+    mock_get_file,
+    mock_list_comments,
+)
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+@pytest.fixture()
+def repo(tmp_path: Path) -> Path:
+    # A checkout with the lockfile of TESTFILE_1 on main and the one of TESTFILE_2 on the pull request's merge ref
+    def git(*args: str) -> None:
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)  # noqa: S603, S607
+
+    git("init", "-b", "main")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    shutil.copy(TESTFILE_1, tmp_path / "poetry.lock")
+    git("add", "poetry.lock")
+    git("commit", "-m", "base")
+    shutil.copy(TESTFILE_2, tmp_path / "poetry.lock")
+    git("commit", "-am", "head")
+    git("update-ref", "refs/remotes/pull/1/merge", "HEAD")
+    git("reset", "--hard", "HEAD~1")
+    return tmp_path
+
+
+def test_read_blobs(repo: Path) -> None:
+    git = GitRepository(str(repo))
+    base, head = git.resolve("main"), git.resolve("refs/pull/1/merge")
+    assert base is not None
+    assert head is not None
+    base_sha, head_sha = git.ls_tree(base)["poetry.lock"], git.ls_tree(head)["poetry.lock"]
+
+    blobs = git.read_blobs([base_sha, "0" * 40, head_sha])
+
+    assert blobs == {base_sha: load_file(TESTFILE_1), head_sha: load_file(TESTFILE_2)}
+    assert base_sha == blob_sha(load_file(TESTFILE_1))
+    assert git.resolve("missing") is None
+
+
+def test_e2e_lockfiles_from_local_repository(repo: Path) -> None:
+    cfg = create_settings()
+    cfg.git_repository = str(repo)
+    summary = format_comment(diff(load_packages(TESTFILE_1), load_packages(TESTFILE_2)))
+
+    with requests_mock.Mocker() as m:
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        do_diff(cfg)
+
+        assert not [r for r in m.request_history if "/contents" in r.path]
+        assert m.last_request.json() == {"body": f"{MAGIC_COMMENT_IDENTIFIER}{summary}"}
+
+
+def test_e2e_missing_ref_falls_back_to_api(repo: Path) -> None:
+    cfg = create_settings()
+    cfg.git_repository = str(repo)
+    cfg.ref = "refs/pull/2/merge"
+
+    with requests_mock.Mocker() as m:
+        # the blob must not exist in the local repository either, or it would be read from there
+        mock_get_file(m, cfg, load_file(TESTFILE_2) + b"\n", cfg.ref)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        do_diff(cfg)
+
+        # only the lockfile of the missing ref is downloaded, the base lockfile is read locally
+        downloads = [r.qs["ref"] for r in m.request_history if is_download(r)]
+        assert downloads == [["refs/pull/2/merge"]]
@@ -0,0 +1,91 @@
+import json
+import shutil
+from pathlib import Path
+from textwrap import dedent
+
+import requests_mock
+from _pytest.capture import CaptureFixture
+
+from diff_poetry_lock.cli import main
+from diff_poetry_lock.github import MAGIC_COMMENT_IDENTIFIER
+from diff_poetry_lock.graph import DependencyGraph, root_dependencies
+from diff_poetry_lock.lockfile import LockedPackage
+from diff_poetry_lock.run_poetry import do_diff, load_packages
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    create_settings,
+    load_file,
+    mock_get_file,
+    mock_list_comments,
+)
+
+PYPROJECT = b"""\
+[tool.poetry.dependencies]
+python = "^3.10"
+Requests = "^2.28.2"
+
+[tool.poetry.group.dev.dependencies]
+pytest = "^7.2.2"
+
+[project]
+dependencies = ["attrs>=22", "typing_extensions ; python_version < '3.11'"]
+"""
+
+
+def test_root_dependencies() -> None:
+    assert root_dependencies(PYPROJECT) == {"requests", "pytest", "attrs", "typing-extensions"}
+
+
+def test_explain() -> None:
+    graph = DependencyGraph(load_packages(TESTFILE_1), {"requests"})
+
+    assert graph.explain("requests") == "direct dependency"
+    assert graph.explain("urllib3") == "via requests"
+    assert graph.explain("typing-extensions") == "required by pydantic"
+    assert graph.explain("pydantic") is None
+
+
+def test_explain_deep_chain() -> None:
+    packages = [LockedPackage(f"p{i}", "1.0", (f"p{i + 1}",)) for i in range(10000)]
+    graph = DependencyGraph(packages, {"p0"})
+
+    assert graph.chain("p9999") == [f"p{i}" for i in range(10000)]
+
+
+def test_cli_explain(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    for name, lockfile in (("old", TESTFILE_2), ("new", TESTFILE_1)):
+        (tmp_path / name).mkdir()
+        shutil.copy(lockfile, tmp_path / name / "poetry.lock")
+        (tmp_path / name / "pyproject.toml").write_bytes(PYPROJECT)
+
+    assert main([str(tmp_path / "old" / "poetry.lock"), str(tmp_path / "new" / "poetry.lock")]) == 0
+    main([str(tmp_path / "old" / "poetry.lock"), str(tmp_path / "new" / "poetry.lock"), "--explain"])
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r.get("reason") for r in records] == [None] * 3 + ["via requests", None, "direct dependency"]
+
+
+def test_e2e_explain_dependencies() -> None:
+    cfg = create_settings()
+    cfg.explain_dependencies = True
+
+    with requests_mock.Mocker() as m:
+        mock_get_file(m, cfg, load_file(TESTFILE_1), cfg.base_ref)
+        mock_get_file(m, cfg, load_file(TESTFILE_2), cfg.ref)
+        m.get(f"{cfg.api_url}/repos/{cfg.repository}/contents/pyproject.toml?ref={cfg.base_ref}", content=PYPROJECT)
+        m.get(f"{cfg.api_url}/repos/{cfg.repository}/contents/pyproject.toml?ref={cfg.ref}", status_code=404)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        do_diff(cfg)
+
+        expected_comment = """\
+        ### Detected 3 changes to dependencies in Poetry lockfile
+
+        Removed **pydantic** (1.10.6)
+        Removed **typing-extensions** (4.5.0) — direct dependency
+        Updated **urllib3** (1.26.15 -> 1.26.14, downgrade) — required by requests
+
+        *(0 added, 2 removed, 1 updated, 4 not changed)*"""
+        assert m.last_request.json() == {"body": f"{MAGIC_COMMENT_IDENTIFIER}{dedent(expected_comment)}"}
@@ -0,0 +1,116 @@
+import json
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from diff_poetry_lock.github import MAGIC_BOT_USER_ID, MAGIC_COMMENT_IDENTIFIER
+from diff_poetry_lock.graphql import GithubGraphqlApi
+from diff_poetry_lock.run_poetry import diff, do_diff, format_comment, load_packages
+from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.test.helpers import TESTFILE_1, TESTFILE_2, blob_sha, create_settings, load_file
+from diff_poetry_lock.test.stub_server import StubGithubServer, StubResponse
+
+
+class MockGraphqlEndpoint:
+    # Answers the queries of GithubGraphqlApi from a fixed set of blobs and comments, 100 comments per page
+    def __init__(self, cfg: Settings, files: dict[str, bytes], comments: list[dict[str, Any]]) -> None:
+        self.files = files
+        self.comments = comments
+        self.queries: list[dict[str, Any]] = []
+        self.server = StubGithubServer()
+        self.server.route("POST", "/graphql", self.handle)
+        cfg.api_url = self.server.url
+        cfg.graphql_url = f"{self.server.url}/graphql"
+        cfg.api_transport = "graphql"
+
+    def handle(self, h: BaseHTTPRequestHandler) -> StubResponse:
+        request = json.loads(h.request_body)  # type: ignore[attr-defined]
+        self.queries.append(request)
+        variables = request["variables"]
+
+        repository: dict[str, Any] = {}
+        for key, expression in variables.items():
+            if key.startswith("e"):
+                data = self.files.get(expression)
+                blob = {"oid": blob_sha(data), "text": data.decode(), "isTruncated": False} if data else None
+                repository[f"f{key[1:]}"] = blob
+
+        if "number" in variables:
+            start = int(variables["cursor"] or 0)
+            page = self.comments[start : start + 100]
+            nodes = [{"databaseId": c["id"], "body": c["body"], "author": {"databaseId": c["user"]}} for c in page]
+            page_info = {"hasNextPage": start + 100 < len(self.comments), "endCursor": str(start + 100)}
+            repository["pullRequest"] = {"comments": {"pageInfo": page_info, "nodes": nodes}}
+        return 200, {}, json.dumps({"data": {"repository": repository}}).encode()
+
+
+def test_graphql_fetches_everything_in_one_query() -> None:
+    cfg = create_settings()
+    files = {f"{cfg.base_ref}:poetry.lock": load_file(TESTFILE_1), f"{cfg.ref}:poetry.lock": load_file(TESTFILE_2)}
+    mock = MockGraphqlEndpoint(cfg, files, [])
+    posted: list[Any] = []
+
+    def post_comment(h: BaseHTTPRequestHandler) -> StubResponse:
+        posted.append(json.loads(h.request_body))  # type: ignore[attr-defined]
+        return 201, {}, b"{}"
+
+    mock.server.route("POST", f"/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments", post_comment)
+
+    with mock.server.running():
+        do_diff(cfg)
+
+    summary = format_comment(diff(load_packages(TESTFILE_1), load_packages(TESTFILE_2)))
+    assert len(mock.queries) == 1
+    assert len(mock.server.requests) == 2
+    assert posted == [{"body": f"{MAGIC_COMMENT_IDENTIFIER}{summary}"}]
+
+
+def test_graphql_paginates_comments() -> None:
+    cfg = create_settings()
+    data = load_file(TESTFILE_1)
+    summary = format_comment(diff(load_packages(TESTFILE_1), []))
+    comments = [{"id": i, "body": "foobar", "user": 123} for i in range(150)]
+    comments.append({"id": 1337, "body": f"{MAGIC_COMMENT_IDENTIFIER}{summary}", "user": MAGIC_BOT_USER_ID})
+    mock = MockGraphqlEndpoint(cfg, {f"{cfg.base_ref}:poetry.lock": data, f"{cfg.ref}:poetry.lock": data}, comments)
+    mock.server.route_json("DELETE", f"/repos/{cfg.repository}/issues/comments/1337", {})
+
+    with mock.server.running():
+        do_diff(cfg)
+
+    assert len(mock.queries) == 2
+    assert mock.server.requests[-1] == ("DELETE", f"/repos/{cfg.repository}/issues/comments/1337")
+
+
+def test_graphql_uses_remembered_comment(tmp_path: Path) -> None:
+    cfg = create_settings()
+    cfg.cache_dir = str(tmp_path)
+    data = load_file(TESTFILE_1)
+    summary = format_comment(diff(load_packages(TESTFILE_1), []))
+    comment = {"id": 1337, "body": f"{MAGIC_COMMENT_IDENTIFIER}{summary}", "user": MAGIC_BOT_USER_ID}
+    comments = [*({"id": i, "body": "foobar", "user": 123} for i in range(150)), comment]
+    mock = MockGraphqlEndpoint(cfg, {f"{cfg.base_ref}:poetry.lock": data, f"{cfg.ref}:poetry.lock": data}, comments)
+    mock.server.route_json(
+        "GET",
+        f"/repos/{cfg.repository}/issues/comments/1337",
+        {**comment, "user": {"id": MAGIC_BOT_USER_ID}, "issue_url": f"{cfg.api_url}/repos/{cfg.repository}/issues/1"},
+    )
+    GithubGraphqlApi(cfg).comment_ids.put(f"{cfg.repository}#{cfg.pr_num()}", [1337])  # type: ignore[union-attr]
+    mock.server.route_json("DELETE", f"/repos/{cfg.repository}/issues/comments/1337", {})
+
+    with mock.server.running():
+        do_diff(cfg)
+
+    # The remembered comment is fetched by its id instead of paging through the comments
+    assert len(mock.queries) == 1
+    assert "pullRequest" not in mock.queries[0]["query"]
+    assert mock.server.requests[-1] == ("DELETE", f"/repos/{cfg.repository}/issues/comments/1337")
+
+
+def test_graphql_missing_lockfile() -> None:
+    cfg = create_settings()
+    mock = MockGraphqlEndpoint(cfg, {f"{cfg.base_ref}:poetry.lock": load_file(TESTFILE_1)}, [])
+
+    with mock.server.running(), pytest.raises(FileNotFoundError):
+        do_diff(cfg)
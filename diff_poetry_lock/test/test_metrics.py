@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+import requests_mock
+
+from diff_poetry_lock.metrics import Metrics
+from diff_poetry_lock.run_poetry import do_diff
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    create_settings,
+    load_file,
+    mock_get_file,
+    mock_list_comments,
+)
+
+
+def test_metrics_report() -> None:
+    metrics = Metrics()
+    metrics.record("diff", 0.25)
+    metrics.record("diff", 0.5)
+    metrics.count("requests", 3)
+
+    assert metrics.report() == {
+        "spans": {"diff": {"calls": 2, "total_ms": 750.0, "max_ms": 500.0}},
+        "counters": {"requests": 3},
+    }
+    assert "| diff | 2 | 750 ms | 500 ms |" in metrics.markdown()
+
+
+def test_e2e_metrics_are_written(tmp_path: Path) -> None:
+    cfg = create_settings()
+    cfg.step_summary = str(tmp_path / "summary.md")
+    cfg.metrics_file = str(tmp_path / "metrics.json")
+    (tmp_path / "summary.md").write_text("Output of an earlier step\n")
+    data1, data2 = load_file(TESTFILE_1), load_file(TESTFILE_2)
+
+    with requests_mock.Mocker() as m:
+        mock_get_file(m, cfg, data1, cfg.base_ref)
+        mock_get_file(m, cfg, data2, cfg.ref)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        do_diff(cfg)
+
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    calls = {name: span["calls"] for name, span in report["spans"].items()}
+    assert calls == {
+        "list_comments": 1,
+        "get_file": 2,
+        "load_packages": 2,
+        "diff": 1,
+        "format_comment": 1,
+        "upsert_comment": 1,
+        "total": 1,
+    }
+    assert report["counters"]["requests"] == 6
+    assert report["counters"]["bytes_received"] >= len(data1) + len(data2)
+
+    summary = (tmp_path / "summary.md").read_text()
+    assert summary.startswith("Output of an earlier step\n### diff-poetry-lock timings")
@@ -1,18 +1,41 @@
+import subprocess
+import sys
+from base64 import b64encode
+from io import BytesIO
 from operator import attrgetter
+from pathlib import Path
 from textwrap import dedent
 from typing import Any
 
 import pytest
 import requests_mock
 from _pytest.monkeypatch import MonkeyPatch
-from requests_mock import Mocker
 
-from diff_poetry_lock.github import MAGIC_COMMENT_IDENTIFIER
-from diff_poetry_lock.run_poetry import PackageSummary, diff, do_diff, format_comment, load_packages, main
+from diff_poetry_lock.github import MAGIC_COMMENT_IDENTIFIER, GithubApi, GithubComment
+from diff_poetry_lock.lockfile import LockedPackage
+from diff_poetry_lock.run_poetry import (
+    MAX_COMMENT_LENGTH,
+    PackageSummary,
+    diff,
+    do_diff,
+    format_comment,
+    load_packages,
+    main,
+    post_comment,
+    split_comment,
+)
 from diff_poetry_lock.settings import Settings
-
-TESTFILE_1 = "diff_poetry_lock/test/res/poetry1.lock"
-TESTFILE_2 = "diff_poetry_lock/test/res/poetry2.lock"
+from diff_poetry_lock.test.helpers import (
+    TESTFILE_1,
+    TESTFILE_2,
+    blob_sha,
+    create_settings,
+    is_download,
+    load_file,
+    mock_get_file,
+    mock_get_file_sha,
+    mock_list_comments,
+)
 
 
 @pytest.fixture()
@@ -77,7 +100,7 @@ def test_diff() -> None:
 
     Removed **pydantic** (1.10.6)
     Removed **typing-extensions** (4.5.0)
-    Updated **urllib3** (1.26.15 -> 1.26.14)
+    Updated **urllib3** (1.26.15 -> 1.26.14, downgrade)
 
     *(0 added, 2 removed, 1 updated, 4 not changed)*"""
     assert format_comment(summary) == dedent(expected_comment)
@@ -105,7 +128,7 @@ def test_diff_2() -> None:
 
     Added **pydantic** (1.10.6)
     Added **typing-extensions** (4.5.0)
-    Updated **urllib3** (1.26.14 -> 1.26.15)
+    Updated **urllib3** (1.26.14 -> 1.26.15, patch)
 
     *(2 added, 0 removed, 1 updated, 4 not changed)*"""
     assert format_comment(summary) == dedent(expected_comment)
@@ -128,10 +151,235 @@ def test_diff_no_changes() -> None:
     assert format_comment(summary) is None
 
 
-def test_file_loading_missing_file_base_ref(cfg: Settings) -> None:
+@pytest.mark.parametrize(("old_file", "new_file"), [(TESTFILE_1, TESTFILE_2), (TESTFILE_2, TESTFILE_1)])
+def test_toml_parser_matches_locker(old_file: str, new_file: str) -> None:
+    fast = diff(load_packages(old_file), load_packages(new_file))
+    locker = diff(load_packages(old_file, use_locker=True), load_packages(new_file, use_locker=True))
+
+    assert fast == locker
+    assert format_comment(fast) == format_comment(locker)
+    assert load_packages(old_file) == load_packages(old_file, use_locker=True)
+
+
+def test_diff_artifacts_changed() -> None:
+    data = load_file(TESTFILE_2)
+    # Same version of idna, but one of its files was re-published with different contents
+    republished = data.replace(b"90b77e79eaa3eba6de819a0c442c0b4ceefc341a7a2ab77d7562bf49f425c5c2", b"0" * 64)
+    assert republished != data
+    old, new = (load_packages(d, artifact_digests=True) for d in (data, republished))
+
+    assert not [p for p in diff(old, new) if p.changed()]
+    # Without artifact detection, the digests are not even computed
+    assert not any(p.digest for p in load_packages(republished))
+
+    summary = sorted(diff(old, new, compare_artifacts=True), key=attrgetter("name"))
+    assert [(p.name, p.change()) for p in summary if p.changed()] == [("idna", "artifacts changed")]
+    assert not any(p.updated() for p in summary)
+    assert format_comment(summary) == (
+        "### Detected 1 changes to dependencies in Poetry lockfile\n\n"
+        "Changed artifacts of **idna** (3.4): file hashes or source differ\n\n"
+        "*(0 added, 0 removed, 0 updated, 1 with changed artifacts, 4 not changed)*"
+    )
+
+
+def test_load_packages_from_memory() -> None:
+    data = load_file(TESTFILE_1)
+
+    assert load_packages(data) == load_packages(TESTFILE_1)
+    assert load_packages(BytesIO(data)) == load_packages(TESTFILE_1)
+    assert load_packages(data, use_locker=True) == load_packages(TESTFILE_1, use_locker=True)
+
+
+def test_poetry_is_imported_lazily() -> None:
+    code = "import sys, diff_poetry_lock.run_poetry; print(any(m.startswith('poetry') for m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, check=True, text=True)  # noqa: S603
+
+    assert output.stdout.strip() == "False"
+
+
+def test_toml_parser_git_source(tmp_path: Path) -> None:
+    lockfile = tmp_path / "poetry.lock"
+    lockfile.write_text(
+        dedent(
+            """\
+            [[package]]
+            name = "foo"
+            version = "1.0.0"
+            description = ""
+            optional = false
+            python-versions = "*"
+            files = []
+
+            [package.source]
+            type = "git"
+            url = "https://github.com/foo/foo.git"
+            reference = "main"
+            resolved_reference = "0123456789abcdef0123456789abcdef01234567"
+
+            [metadata]
+            lock-version = "2.0"
+            python-versions = "^3.10"
+            content-hash = "0"
+            """,
+        ),
+    )
+
+    [package] = load_packages(str(lockfile), artifact_digests=True)
+    assert package[:3] == LockedPackage("foo", "1.0.0 0123456")[:3]
+    assert package.digest
+    assert load_packages(str(lockfile)) == load_packages(str(lockfile), use_locker=True)
+    assert load_packages(str(lockfile), artifact_digests=True) == load_packages(
+        str(lockfile),
+        use_locker=True,
+        artifact_digests=True,
+    )
+
+
+def test_format_comment_collapses_large_diffs() -> None:
+    packages = [PackageSummary(f"package-{i}", None, "1.0.0") for i in range(60)]
+    packages.append(PackageSummary("removed", "1.0.0", None))
+
+    comment = format_comment(packages)
+
+    assert comment is not None
+    assert "<details><summary>60 added</summary>\n\nAdded **package-0** (1.0.0)" in comment
+    assert "<details><summary>1 removed</summary>\n\nRemoved **removed** (1.0.0)\n\n</details>" in comment
+    assert comment.endswith("</details>\n\n*(60 added, 1 removed, 0 updated, 0 not changed)*")
+
+
+def test_split_comment() -> None:
+    packages = [PackageSummary(f"package-{i:05}", "1.0.0", "2.0.0") for i in range(2500)]
+    comment = format_comment(packages)
+    assert comment is not None
+
+    parts = split_comment(comment)
+
+    assert len(parts) == 2
+    assert all(len(MAGIC_COMMENT_IDENTIFIER + part) <= MAX_COMMENT_LENGTH for part in parts)
+    assert all(part.count("<details>") == part.count("</details>") == 1 for part in parts)
+    assert parts[1].startswith("<details><summary>2500 updated</summary>\n\nUpdated **package-")
+    assert parts[0].endswith("\n\n</details>\n\n*(part 1 of 2)*\n<!-- part 1 of 2 -->")
+    assert parts[1].endswith("not changed)*\n\n*(part 2 of 2)*\n<!-- part 2 of 2 -->")
+    lines = [line for part in parts for line in part.splitlines() if line.startswith("Updated")]
+    assert lines == [p.summary_line() for p in packages]
+    assert split_comment("short") == ["short"]
+
+
+def test_split_comment_with_long_lines() -> None:
+    long_line = "x" * (3 * MAX_COMMENT_LENGTH)
+    comment = (
+        f"Updated **a** (1.0.0 -> 2.0.0)\n{long_line}\n<details><summary>1 updated</summary>\n\n{long_line}\n</details>"
+    )
+
+    parts = split_comment(comment)
+
+    assert all(len(MAGIC_COMMENT_IDENTIFIER + part) <= MAX_COMMENT_LENGTH for part in parts)
+    assert all(part.count("<details>") == part.count("</details>") for part in parts)
+    assert sum(part.count("x") for part in parts) == 2 * len(long_line)
+
+
+def test_post_comment_in_parts(cfg: Settings) -> None:
+    comments = [
+        GithubComment.parse_obj({"id": i, "body": f"{MAGIC_COMMENT_IDENTIFIER}part {i}", "user": {"id": 41898282}})
+        for i in (1, 2, 3)
+    ]
+
+    with requests_mock.Mocker() as m:
+        m.patch(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/1")
+        m.patch(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/2")
+        m.delete(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/2")
+        m.delete(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/3")
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        post_comment(GithubApi(cfg), "short", comments)
+        assert [(r.method, r.path.rsplit("/", 1)[-1]) for r in m.request_history] == [
+            ("PATCH", "1"),
+            ("DELETE", "2"),
+            ("DELETE", "3"),
+        ]
+
+        m.reset_mock()
+        long_comment = "\n".join(f"Updated **package-{i}** (1.0.0 -> 2.0.0)" for i in range(4000))
+        post_comment(GithubApi(cfg), long_comment, comments[:2])
+        assert [(r.method, r.path.rsplit("/", 1)[-1]) for r in m.request_history] == [
+            ("PATCH", "1"),
+            ("PATCH", "2"),
+            ("POST", "comments"),
+        ]
+        assert m.request_history[2].json()["body"].endswith("*(part 3 of 3)*\n<!-- part 3 of 3 -->")
+
+
+def test_parts_on_different_pages(cfg: Settings) -> None:
+    # Part 2 was added by a later run, after other comments had been posted
+    def bot_comment(comment_id: int, part: int) -> dict[str, Any]:
+        body = f"{MAGIC_COMMENT_IDENTIFIER}part {part}\n\n*(part {part} of 2)*\n<!-- part {part} of 2 -->"
+        return {"id": comment_id, "body": body, "user": {"id": 41898282}}
+
+    others = [{"id": i, "body": "LGTM", "user": {"id": 1}} for i in range(2, 200)]
+    url = f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments?per_page=100"
+
     with requests_mock.Mocker() as m:
+        mock_list_comments(m, cfg, [bot_comment(1, 1), *others[:99]], last_page=2)
+        m.get(f"{url}&page=2", json=[*others[99:148], bot_comment(150, 2), *others[148:]])
+        for comment_id in (1, 150):
+            m.patch(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/{comment_id}")
+            m.delete(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/{comment_id}")
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        existing = GithubApi(cfg).list_comments()
+        assert [c.id_ for c in existing] == [1, 150]
+
+        m.reset_mock()
+        long_comment = "\n".join(f"Updated **package-{i}** (1.0.0 -> 2.0.0)" for i in range(4000))
+        post_comment(GithubApi(cfg), long_comment, existing)
+        assert [(r.method, r.path.rsplit("/", 1)[-1]) for r in m.request_history] == [
+            ("PATCH", "1"),
+            ("PATCH", "150"),
+            ("POST", "comments"),
+        ]
+
+        m.reset_mock()
+        post_comment(GithubApi(cfg), None, existing)
+        assert [(r.method, r.path.rsplit("/", 1)[-1]) for r in m.request_history] == [
+            ("DELETE", "1"),
+            ("DELETE", "150"),
+        ]
+
+
+def test_comments_are_searched_from_the_newest_page(cfg: Settings) -> None:
+    # The comment was deleted and posted again in two parts, which ended up on the last two pages
+    def bot_comment(comment_id: int, part: int) -> dict[str, Any]:
+        body = f"{MAGIC_COMMENT_IDENTIFIER}part {part}\n\n*(part {part} of 2)*\n<!-- part {part} of 2 -->"
+        return {"id": comment_id, "body": body, "user": {"id": 41898282}}
+
+    others = [{"id": i, "body": "LGTM", "user": {"id": 1}} for i in range(1000, 1400)]
+    url = f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments?per_page=100"
+
+    with requests_mock.Mocker() as m:
+        mock_list_comments(m, cfg, others[:100], last_page=5)
+        m.get(f"{url}&page=2", json=others[100:200])
+        m.get(f"{url}&page=3", json=others[200:300])
+        m.get(f"{url}&page=4", json=[*others[300:399], bot_comment(1, 1)])
+        m.get(f"{url}&page=5", json=[bot_comment(2, 2)])
+
+        assert [c.id_ for c in GithubApi(cfg).list_comments()] == [1, 2]
+        assert [r.qs["page"] for r in m.request_history] == [["1"], ["5"], ["4"]]
+
+        # Without a bot comment, every page has to be read
+        m.get(f"{url}&page=4", json=others[300:400])
+        m.get(f"{url}&page=5", json=[])
+        m.reset_mock()
+        assert GithubApi(cfg).list_comments() == []
+        assert [r.qs["page"] for r in m.request_history] == [["1"], ["5"], ["4"], ["3"], ["2"]]
+
+
+def test_file_loading_missing_file_base_ref(cfg: Settings, data1: bytes) -> None:
+    with requests_mock.Mocker() as m:
+        mock_get_file_sha(m, cfg, None, cfg.base_ref)
+        mock_get_file_sha(m, cfg, data1, cfg.ref)
         m.get(
             f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}?ref={cfg.base_ref}",
+            request_headers={"Accept": "application/vnd.github.raw"},
             headers={"Authorization": f"Bearer {cfg.token}", "Accept": "application/vnd.github.raw"},
             status_code=404,
         )
@@ -142,13 +390,17 @@ def test_file_loading_missing_file_base_ref(cfg: Settings) -> None:
 
 def test_file_loading_missing_file_head_ref(cfg: Settings, data1: bytes) -> None:
     with requests_mock.Mocker() as m:
+        mock_get_file_sha(m, cfg, data1, cfg.base_ref)
+        mock_get_file_sha(m, cfg, None, cfg.ref)
         m.get(
             f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}?ref={cfg.base_ref}",
+            request_headers={"Accept": "application/vnd.github.raw"},
             headers={"Authorization": f"Bearer {cfg.token}", "Accept": "application/vnd.github.raw"},
             content=data1,
         )
         m.get(
             f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}?ref={cfg.ref}",
+            request_headers={"Accept": "application/vnd.github.raw"},
             headers={"Authorization": f"Bearer {cfg.token}", "Accept": "application/vnd.github.raw"},
             status_code=404,
         )
@@ -185,6 +437,20 @@ def test_e2e_no_diff_inexisting_comment(cfg: Settings, data1: bytes) -> None:
         do_diff(cfg)
 
 
+def test_e2e_unchanged_lockfile_is_not_downloaded(cfg: Settings, data1: bytes) -> None:
+    with requests_mock.Mocker() as m:
+        mock_get_file_sha(m, cfg, data1, cfg.base_ref)
+        mock_get_file_sha(m, cfg, data1, cfg.ref)
+        comments = [{"body": f"{MAGIC_COMMENT_IDENTIFIER}foobar", "id": 1337, "user": {"id": 41898282}}]
+        mock_list_comments(m, cfg, comments)
+        m.delete(f"{cfg.api_url}/repos/{cfg.repository}/issues/comments/1337")
+
+        do_diff(cfg)
+
+        assert not [r for r in m.request_history if is_download(r)]
+        assert m.last_request.method == "DELETE"
+
+
 def test_e2e_diff_inexisting_comment(cfg: Settings, data1: bytes, data2: bytes) -> None:
     summary = format_comment(diff(load_packages(TESTFILE_2), load_packages(TESTFILE_1)))
 
@@ -240,38 +506,77 @@ def test_e2e_diff_existing_comment_different_data(cfg: Settings, data1: bytes, d
         do_diff(cfg)
 
 
-def load_file(filename: str) -> bytes:
-    with open(filename, "rb") as f:
-        return f.read()
+def test_e2e_small_lockfiles_come_with_their_sha(cfg: Settings, data1: bytes, data2: bytes) -> None:
+    with requests_mock.Mocker() as m:
+        for ref, data in ((cfg.base_ref, data1), (cfg.ref, data2)):
+            entry = {"type": "file", "sha": blob_sha(data), "encoding": "base64", "content": b64encode(data).decode()}
+            m.get(f"{cfg.api_url}/repos/{cfg.repository}/contents/{cfg.lockfile_path}?ref={ref}", json=entry)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
+
+        do_diff(cfg)
+
+        # Both lockfiles came inline with the metadata, so neither one is downloaded
+        assert not [r for r in m.request_history if is_download(r)]
+        body = m.last_request.json()["body"]
+
+    assert body == f"{MAGIC_COMMENT_IDENTIFIER}{format_comment(diff(load_packages(data1), load_packages(data2)))}"
 
 
-def mock_list_comments(m: Mocker, s: Settings, response_json: list[dict[Any, Any]]) -> None:
-    m.get(
-        f"{s.api_url}/repos/{s.repository}/issues/{s.pr_num()}/comments?per_page=100&page=1",
-        headers={"Authorization": f"Bearer {s.token}", "Accept": "application/vnd.github.raw"},
-        json=response_json,
-    )
+def test_e2e_multiple_lockfiles(data1: bytes, data2: bytes) -> None:
+    cfg = create_settings(lockfile_path="services/*/poetry.lock, tools/poetry.lock")
+    trees = {
+        cfg.base_ref: {"services/a/poetry.lock": data1, "services/b/poetry.lock": data1, "tools/poetry.lock": data2},
+        cfg.ref: {"services/a/poetry.lock": data2, "services/b/poetry.lock": data1, "services/c/poetry.lock": data2},
+    }
 
+    with requests_mock.Mocker() as m:
+        for ref, files in trees.items():
+            tree = [{"path": path, "type": "blob", "sha": blob_sha(data)} for path, data in files.items()]
+            tree.append({"path": "poetry.lock", "type": "blob", "sha": "0" * 40})
+            m.get(f"{cfg.api_url}/repos/{cfg.repository}/git/trees/{ref}?recursive=1", json={"tree": tree})
+            for path, data in files.items():
+                m.get(f"{cfg.api_url}/repos/{cfg.repository}/contents/{path}?ref={ref}", content=data)
+        mock_list_comments(m, cfg, [])
+        m.post(f"{cfg.api_url}/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments")
 
-def mock_get_file(m: Mocker, s: Settings, data: bytes, ref: str) -> None:
-    m.get(
-        f"{s.api_url}/repos/{s.repository}/contents/{s.lockfile_path}?ref={ref}",
-        headers={"Authorization": f"Bearer {s.token}", "Accept": "application/vnd.github.raw"},
-        content=data,
-    )
+        do_diff(cfg)
 
+        downloads = sorted((r.path, r.qs["ref"][0]) for r in m.request_history if is_download(r))
+        body = m.last_request.json()["body"]
 
-def create_settings(
-    repository: str = "user/repo",
-    lockfile_path: str = "poetry.lock",
-    token: str = "foobar",  # noqa: S107
-) -> Settings:
-    return Settings(
-        event_name="pull_request",
-        ref="refs/pull/1/merge",
-        repository=repository,
-        token=token,
-        base_ref="main",
-        lockfile_path=lockfile_path,
-        api_url="http://localhost/github_api",
-    )
+    assert downloads == [
+        ("/github_api/repos/user/repo/contents/services/a/poetry.lock", "main"),
+        ("/github_api/repos/user/repo/contents/services/a/poetry.lock", "refs/pull/1/merge"),
+        ("/github_api/repos/user/repo/contents/services/c/poetry.lock", "refs/pull/1/merge"),
+        ("/github_api/repos/user/repo/contents/tools/poetry.lock", "main"),
+    ]
+    expected_comment = """\
+    ### Detected 3 changes to dependencies in `services/a/poetry.lock`
+
+    Removed **pydantic** (1.10.6)
+    Removed **typing-extensions** (4.5.0)
+    Updated **urllib3** (1.26.15 -> 1.26.14, downgrade)
+
+    *(0 added, 2 removed, 1 updated, 4 not changed)*
+
+    ### Detected 5 changes to dependencies in `services/c/poetry.lock`
+
+    Added **certifi** (2022.12.7)
+    Added **charset-normalizer** (3.1.0)
+    Added **idna** (3.4)
+    Added **requests** (2.28.2)
+    Added **urllib3** (1.26.14)
+
+    *(5 added, 0 removed, 0 updated, 0 not changed)*
+
+    ### Detected 5 changes to dependencies in `tools/poetry.lock`
+
+    Removed **certifi** (2022.12.7)
+    Removed **charset-normalizer** (3.1.0)
+    Removed **idna** (3.4)
+    Removed **requests** (2.28.2)
+    Removed **urllib3** (1.26.14)
+
+    *(0 added, 5 removed, 0 updated, 0 not changed)*"""
+    assert body == f"{MAGIC_COMMENT_IDENTIFIER}{dedent(expected_comment)}"
@@ -0,0 +1,156 @@
+import json
+import socket
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+from requests import Response
+
+from diff_poetry_lock.run_poetry import do_diff
+from diff_poetry_lock.test.helpers import TESTFILE_1, TESTFILE_2, blob_sha, create_settings, load_file
+from diff_poetry_lock.test.stub_server import StubGithubServer, StubHandler, StubResponse
+from diff_poetry_lock.transport import RetryingSession, rate_limit_delay
+
+
+def flaky(failures: int, handler: StubHandler, failure: StubResponse = (502, {}, b"")) -> StubHandler:
+    # Answers with the failure response the given number of times before handing over to the handler
+    remaining = [failures]
+    lock = threading.Lock()
+
+    def flaky_handler(h: BaseHTTPRequestHandler) -> StubResponse:
+        with lock:
+            if remaining[0] > 0:
+                remaining[0] -= 1
+                return failure
+        return handler(h)
+
+    return flaky_handler
+
+
+def make_response(status: int, headers: dict[str, str]) -> Response:
+    r = Response()
+    r.status_code = status
+    r.headers.update(headers)
+    return r
+
+
+def test_get_is_retried_after_server_errors() -> None:
+    server = StubGithubServer()
+    server.route("GET", "/flaky", flaky(2, lambda _: (200, {}, b"ok")))
+    session = RetryingSession(retries=3, backoff=0.01)
+
+    with server.running():
+        r = session.get(f"{server.url}/flaky", timeout=10)
+
+    assert r.content == b"ok"
+    assert len(server.requests) == 3
+    assert session.retried == 2
+    assert [t.status for t in session.timings] == [502, 502, 200]
+
+
+def test_retries_are_limited() -> None:
+    server = StubGithubServer()
+    server.route("GET", "/flaky", flaky(5, lambda _: (200, {}, b"ok")))
+    session = RetryingSession(retries=2, backoff=0.01)
+
+    with server.running():
+        r = session.get(f"{server.url}/flaky", timeout=10)
+
+    assert r.status_code == 502
+    assert len(server.requests) == 3
+
+
+def test_post_is_not_retried_after_server_errors() -> None:
+    server = StubGithubServer()
+    server.route("POST", "/comments", flaky(1, lambda _: (201, {}, b"")))
+    session = RetryingSession(retries=3, backoff=0.01)
+
+    with server.running():
+        r = session.post(f"{server.url}/comments", json={"body": "comment"}, timeout=10)
+
+    assert r.status_code == 502
+    assert len(server.requests) == 1
+
+
+def test_rate_limited_post_is_retried() -> None:
+    server = StubGithubServer()
+    server.route("POST", "/comments", flaky(1, lambda _: (201, {}, b""), (429, {"Retry-After": "0"}, b"")))
+    session = RetryingSession(retries=3, backoff=0.01)
+
+    with server.running():
+        r = session.post(f"{server.url}/comments", json={"body": "comment"}, timeout=10)
+
+    assert r.status_code == 201
+    assert len(server.requests) == 2
+
+
+def test_connection_errors_are_retried() -> None:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    session = RetryingSession(retries=2, backoff=0.01)
+
+    with pytest.raises(requests.ConnectionError):
+        session.get(f"http://127.0.0.1:{port}/", timeout=10)
+
+    assert [t.status for t in session.timings] == [None, None, None]
+
+
+def test_rate_limit_delay() -> None:
+    now = time.time()
+
+    assert rate_limit_delay(make_response(403, {"Retry-After": "30"})) == 30
+    assert rate_limit_delay(make_response(429, {"Retry-After": formatdate(now + 60, usegmt=True)})) == pytest.approx(
+        60,
+        abs=2,
+    )
+    reset = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(now) + 20)}
+    assert rate_limit_delay(make_response(403, reset)) == pytest.approx(20, abs=2)
+    assert rate_limit_delay(make_response(429, {})) is None
+
+
+def test_retry_delay() -> None:
+    session = RetryingSession(retries=3, backoff=1, max_delay=60)
+    exhausted = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+
+    assert session.retry_delay(make_response(403, {"Retry-After": "5"}), "POST", 0) == 5
+    assert 0 <= (session.retry_delay(make_response(503, {}), "GET", 2) or 0) <= 4
+    # Waiting an hour for the rate limit to reset is not worth it
+    assert session.retry_delay(make_response(403, exhausted), "GET", 0) is None
+    # A plain 403 is a permission problem, not a rate limit
+    assert session.retry_delay(make_response(403, {}), "GET", 0) is None
+    assert session.retry_delay(make_response(503, {}), "GET", 3) is None
+
+
+def test_do_diff_survives_flaky_api() -> None:
+    server = StubGithubServer()
+    cfg = create_settings(api_url=server.url)
+    lockfiles = {cfg.base_ref: load_file(TESTFILE_1), cfg.ref: load_file(TESTFILE_2)}
+
+    def ref(h: BaseHTTPRequestHandler) -> str:
+        return parse_qs(urlsplit(h.path).query)["ref"][0]
+
+    def lockfile(h: BaseHTTPRequestHandler) -> StubResponse:
+        if h.headers["Accept"] == "application/vnd.github.object":
+            entry = {"name": cfg.lockfile_path, "type": "file", "sha": blob_sha(lockfiles[ref(h)])}
+            return 200, {}, json.dumps(entry).encode()
+        return 200, {}, lockfiles[ref(h)]
+
+    # The lockfile endpoint fails twice and the comment listing is rate limited once before they answer
+    server.route("GET", f"/repos/{cfg.repository}/contents/{cfg.lockfile_path}", flaky(2, lockfile))
+    server.route(
+        "GET",
+        f"/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments",
+        flaky(1, lambda _: (200, {}, b"[]"), (429, {"Retry-After": "0"}, b"")),
+    )
+    server.route("POST", f"/repos/{cfg.repository}/issues/{cfg.pr_num()}/comments", lambda _: (201, {}, b"{}"))
+
+    with server.running():
+        do_diff(cfg)
+
+    assert len(server.requests) == 9
+    assert server.requests[-1][0] == "POST"
@@ -0,0 +1,59 @@
+import pytest
+
+from diff_poetry_lock.run_poetry import PackageSummary, diff, filter_updates, load_packages
+from diff_poetry_lock.settings import Settings
+from diff_poetry_lock.test.helpers import TESTFILE_1, TESTFILE_2, create_settings
+from diff_poetry_lock.versions import classify_update, parse_version
+
+
+@pytest.mark.parametrize(
+    ("old", "new", "expected"),
+    [
+        ("1.26.14", "1.26.15", "patch"),
+        ("1.26.15", "1.26.14", "downgrade"),
+        ("1.10.6", "1.11.0", "minor"),
+        ("1.10.6", "2.0.0", "major"),
+        ("1.10.6", "2.0.0b1", "pre-release"),
+        ("1.2", "1.2.0.post1", "patch"),
+        ("2022.12.7", "2023.5.7", "major"),
+        ("1.0.0 0123456", "1.1.0 abcdef0", "minor"),
+        ("1.0.0 0123456", "1.0.0 abcdef0", None),
+        ("1.0.0", "not a version", None),
+    ],
+)
+def test_classify_update(old: str, new: str, expected: str | None) -> None:
+    assert classify_update(old, new) == expected
+
+
+def test_versions_are_parsed_once() -> None:
+    parse_version.cache_clear()
+    old, new = load_packages(TESTFILE_1), load_packages(TESTFILE_2)
+
+    packages = diff(old, new)
+    [p.update_type() for p in packages]
+    [p.update_type() for p in packages]
+
+    assert parse_version.cache_info().misses == 2
+    assert [(p.name, p.update_type()) for p in packages if p.update_type()] == [("urllib3", "downgrade")]
+
+
+def test_filter_updates() -> None:
+    packages = [
+        PackageSummary("a", "1.0.0", "2.0.0"),
+        PackageSummary("b", "1.0.0", "1.0.1"),
+        PackageSummary("c", "1.0.0", "0.9.0"),
+        PackageSummary("d", None, "1.0.0"),
+        PackageSummary("e", "1.0.0", "1.0.0"),
+    ]
+
+    assert [p.name for p in filter_updates(packages, ["major", "downgrade"])] == ["a", "c", "d", "e"]
+    assert [p.name for p in filter_updates(packages, [])] == ["a", "b", "c", "d", "e"]
+
+
+def test_update_types_setting() -> None:
+    cfg = create_settings()
+    cfg.update_types = "major, downgrade"
+    assert cfg.update_type_filter() == ["major", "downgrade"]
+
+    with pytest.raises(ValueError, match="Unknown update types huge"):
+        Settings(**{**cfg.dict(), "update_types": "major,huge"})
@@ -0,0 +1,133 @@
+import random
+import statistics
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, NamedTuple
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+# Server errors that are usually gone a moment later, like a 502 from Github's load balancers
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+# Only requests that can safely be repeated are retried after server and connection errors. Rate limited requests
+# were never processed, so those are retried regardless of their method.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class RequestTiming(NamedTuple):
+    method: str
+    url: str
+    status: int | None  # None if the connection failed
+    seconds: float
+    sent: int = 0  # bytes of the request body
+    received: int = 0  # bytes of the response body
+
+
+# A requests session with a connection pool sized for the worker threads, retries with exponential backoff and full
+# jitter, and rate-limit awareness: `Retry-After` and `X-RateLimit-Reset` tell how long to wait before trying again.
+# Waits longer than max_delay are not worth blocking the job for, so such responses are returned as they are.
+class RetryingSession(requests.Session):
+    def __init__(
+        self,
+        retries: int = 3,
+        pool_size: int = 10,
+        backoff: float = 0.5,
+        max_delay: float = 60.0,
+    ) -> None:
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.timings: list[RequestTiming] = []
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    def request(self, method: str | bytes, url: str | bytes, *args: Any, **kwargs: Any) -> Response:  # noqa: ANN401
+        method = method.decode() if isinstance(method, bytes) else method
+        url = url.decode() if isinstance(url, bytes) else url
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                r = super().request(method, url, *args, **kwargs)
+            except requests.ConnectionError:
+                self._record(RequestTiming(method, url, None, time.perf_counter() - start))
+                if attempt >= self.retries or method.upper() not in IDEMPOTENT_METHODS:
+                    raise
+                delay = self.backoff_delay(attempt)
+            else:
+                sent = len(r.request.body or b"")
+                timing = RequestTiming(method, url, r.status_code, time.perf_counter() - start, sent, len(r.content))
+                self._record(timing)
+                retry_delay = self.retry_delay(r, method, attempt)
+                if retry_delay is None:
+                    return r
+                delay = retry_delay
+
+            print(
+                f"Retrying {method} {url} in {delay:.1f}s (attempt {attempt + 2} of {self.retries + 1})",
+                file=sys.stderr,
+            )
+            time.sleep(delay)
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+
+    def retry_delay(self, r: Response, method: str, attempt: int) -> float | None:
+        # How long to wait before repeating the request, None if the response should be returned
+        if attempt >= self.retries:
+            return None
+
+        rate_limited = r.status_code == 429 or (  # noqa: PLR2004
+            r.status_code == 403  # noqa: PLR2004
+            and ("Retry-After" in r.headers or r.headers.get("X-RateLimit-Remaining") == "0")
+        )
+        if rate_limited:
+            delay = rate_limit_delay(r)
+            if delay is None:
+                delay = self.backoff_delay(attempt)
+            elif delay > self.max_delay:
+                print(f"Rate limited by Github for {delay:.0f}s, not retrying", file=sys.stderr)
+                return None
+            return delay
+
+        if r.status_code in TRANSIENT_STATUSES and method.upper() in IDEMPOTENT_METHODS:
+            return self.backoff_delay(attempt)
+        return None
+
+    def backoff_delay(self, attempt: int) -> float:
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.backoff * 2**attempt))  # noqa: S311
+
+    def _record(self, timing: RequestTiming) -> None:
+        with self._lock:
+            self.timings.append(timing)
+
+    def summary(self) -> str:
+        seconds = [t.seconds for t in self.timings]
+        if not seconds:
+            return "Github API: no requests"
+        return (
+            f"Github API: {len(seconds)} requests ({self.retried} retries), "
+            f"median {statistics.median(seconds) * 1000:.0f} ms, max {max(seconds) * 1000:.0f} ms"
+        )
+
+
+def rate_limit_delay(r: Response) -> float | None:
+    # Secondary rate limits come with Retry-After (seconds or an HTTP date), exhausted quotas with X-RateLimit-Reset
+    if retry_after := r.headers.get("Retry-After"):
+        if retry_after.isdigit():
+            return float(retry_after)
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    if r.headers.get("X-RateLimit-Remaining") == "0" and (reset := r.headers.get("X-RateLimit-Reset", "")).isdigit():
+        return max(0.0, int(reset) - time.time())
+    return None
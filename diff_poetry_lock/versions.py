@@ -0,0 +1,44 @@
+from functools import cache
+
+from packaging.version import InvalidVersion, Version
+
+UPDATE_TYPES = ("major", "minor", "patch", "pre-release", "downgrade")
+
+
+@cache
+def parse_version(version: str) -> Version | None:
+    # Base and head lockfiles mostly contain the same version strings, so each one is only parsed once per process.
+    # Versions of git dependencies carry the commit ("1.0.0 0123456"), which is not part of the PEP 440 version.
+    try:
+        return Version(version.split(" ", 1)[0])
+    except InvalidVersion:
+        return None
+
+
+def parse_update_types(value: str) -> list[str]:
+    # A comma separated list of UPDATE_TYPES, as given in the action input and on the command line
+    types = [t.strip() for t in value.split(",") if t.strip()]
+    if unknown := set(types) - set(UPDATE_TYPES):
+        raise ValueError(f"Unknown update types {', '.join(sorted(unknown))}, use any of {', '.join(UPDATE_TYPES)}")
+    return types
+
+
+def classify_update(old_version: str, new_version: str) -> str | None:
+    # One of UPDATE_TYPES, or None if either version is not a PEP 440 version or only the part that's not, like the
+    # commit of a git dependency, changed
+    old, new = parse_version(old_version), parse_version(new_version)
+    if old is None or new is None or old == new:
+        return None
+    if new < old:
+        return "downgrade"
+    if new.is_prerelease:
+        return "pre-release"
+
+    # The first differing component of the release segment, where 1.2 and 1.2.0 are the same release
+    length = max(len(old.release), len(new.release), 3)
+    old_release, new_release = (v.release + (0,) * (length - len(v.release)) for v in (old, new))
+    if old_release[0] != new_release[0]:
+        return "major"
+    if old_release[1] != new_release[1]:
+        return "minor"
+    return "patch"